@@ -1,10 +1,18 @@
 # Secuelas/backend/api.py
-from flask import Blueprint, request, session, jsonify
-from sqlalchemy import text, exc, asc
-from extensions import db
+import sqlite3
+from contextlib import nullcontext
+from flask import Blueprint, current_app, request, session, jsonify
+from sqlalchemy import text, asc
+from extensions import db, mission_catalog, result_store, sandbox_manager, session_store, verdict_cache
+from sandbox import PLAYER_TABLE, QueryBudget, QueryBudgetExceeded
+from verdict_cache import Verdict, is_cacheable
+from results import ResultSet, fetch_capped
+from result_diff import diff_to_json
+from wire_format import columnar_response, encode_rows, wants_columnar
+from state_delta import STATE_VERSION_HEADER, state_etag, versioned
+from sql_canonical import strip_trailing, tokenize
 from models import MissionDefinitionDB
-from evaluation import compare_results
-from init_db import execute_sql_script
+from evaluation import MissionComparator
 
 main_api_blueprint = Blueprint('main_api', __name__)
 
@@ -20,22 +28,196 @@ def get_mission_from_db(mission_id):
         return None
     return MissionDefinitionDB.query.get(mission_id)
 
-def setup_mission_db(mission_id):
-    """Run this mission's setup SQL. Returns (ok, error_message)."""
+def get_next_mission_from_db(mission_id):
+    return (MissionDefinitionDB.query.filter(MissionDefinitionDB.is_active.is_(True),
+                                             MissionDefinitionDB.id > mission_id)
+            .order_by(asc(MissionDefinitionDB.id)).first())
+
+def get_session_sandbox():
+    """Return this player's private sandbox, allocating an id on first use."""
+    sandbox_id = session.get('sandbox_id')
+    if not sandbox_id:
+        sandbox_id = session['sandbox_id'] = sandbox_manager.new_id()
+    return sandbox_manager.get(sandbox_id)
+
+def setup_mission_db(mission_id, sandbox):
+    """Run this mission's setup SQL inside the player's sandbox. Returns (ok, error_message)."""
     if mission_id is None:
         return False, "ID de mision invalido."
     obj = get_mission_from_db(mission_id)
     if obj is None:
         return False, f"Mision ID {mission_id} no encontrada."
-    if not obj.setup_sql:
-        return True, "Sin setup_sql."
     try:
-        execute_sql_script(db.session, obj.setup_sql)
+        sandbox_manager.load(sandbox, obj)
         return True, "DB configurada."
-    except Exception as e:
-        db.session.rollback()
+    except sqlite3.Error as e:
         return False, f"Error configurando DB para mision {mission_id}: {e}"
 
+def ensure_mission_db(mission_id, sandbox):
+    """
+    Reload the mission only if the sandbox holds other or modified data.
+    Missions with identical setups share a fingerprint and need no reload.
+    """
+    obj = get_mission_from_db(mission_id)
+    if obj is not None and not sandbox.needs_reload(sandbox_manager.templates.fingerprint(obj)):
+        sandbox.mission_id = obj.id
+        return True, "DB lista."
+    return setup_mission_db(mission_id, sandbox)
+
+def warm_mission_templates():
+    """Materialize every active mission's setup and expected result once, at startup."""
+    missions = get_all_missions_from_db()
+    sandbox_manager.templates.build_all(missions)
+    sandbox_manager.expected.build_all(missions)
+
+def run_player_query(sandbox, user_sql, budget=None, comparator=None):
+    """
+    Execute the player's SQL and fetch its result within the query budget and
+    the RESULT_MAX_ROWS / RESULT_MAX_BYTES caps. With a comparator, fetching
+    stops as soon as the verdict is known (order-sensitive missions).
+    Returns a ResultSet; raises QueryBudgetExceeded.
+    """
+    with sandbox.budget(budget):
+        cursor = sandbox.execute(user_sql)
+        try:
+            return ResultSet.from_cursor(cursor, current_app.config['RESULT_MAX_ROWS'],
+                                         current_app.config['RESULT_MAX_BYTES'],
+                                         comparator.early_exit if comparator is not None else None)
+        finally:
+            cursor.close()
+
+def is_select(sql):
+    """True for statements that can be wrapped as a subquery (SELECT/VALUES/WITH ... SELECT)."""
+    tokens = tokenize(sql)
+    if not tokens or tokens[0].upper() not in ('SELECT', 'VALUES', 'WITH'):
+        return False
+    writes = {'INSERT', 'UPDATE', 'DELETE', 'REPLACE'}
+    return not any(t.upper() in writes for t in tokens)
+
+def judge_by_digest(sandbox, comparator, select_sql, budget):
+    """
+    Compare the digest of the player's SELECT with the expected one, without
+    fetching its rows; only the displayed rows are fetched afterwards.
+    Returns (ResultSet, verdict), or None when a detailed comparison is needed.
+    """
+    with sandbox.budget(budget):
+        columns = sandbox.result_columns(select_sql)
+        verdict = comparator.match_digest(
+            columns, lambda indices, ordered: sandbox.result_digest(select_sql, len(columns), indices, ordered))
+    if verdict is None:
+        return None
+    return run_player_query(sandbox, select_sql, budget), verdict
+
+def judge_in_engine(sandbox, comparator, select_sql, budget, expected_table):
+    """
+    Materialize the player's SELECT in the sandbox and compare it with the
+    expected table inside SQLite: only the displayed rows and the first
+    mismatch are fetched into Python. Returns (ResultSet, verdict).
+    """
+    try:
+        with sandbox.budget(budget):
+            columns = sandbox.result_columns(select_sql)
+            sandbox.materialize(PLAYER_TABLE, select_sql)
+            verdict = comparator.compare_in_engine(columns, sandbox.query_internal, PLAYER_TABLE, expected_table)
+        cursor = sandbox.internal_cursor(f'SELECT * FROM temp."{PLAYER_TABLE}"')
+        try:
+            rows, truncated, _ = fetch_capped(cursor, current_app.config['RESULT_MAX_ROWS'],
+                                              current_app.config['RESULT_MAX_BYTES'])
+        finally:
+            cursor.close()
+    finally:
+        sandbox.drop_internal(PLAYER_TABLE)
+    return ResultSet(columns, rows, truncated), verdict
+
+# mission_id -> (expected result, evaluation_options_json, MissionComparator)
+_comparators = {}
+
+def get_comparator(mission):
+    """
+    The mission's compiled comparator, rebuilt only when its expected result
+    or evaluation options change. Results kept as digests only are judged by
+    digest and their rows reloaded on demand.
+    """
+    expected = sandbox_manager.expected.get(mission)
+    cached = _comparators.get(mission.id)
+    if cached is None or cached[0] is not expected or cached[1] != mission.evaluation_options_json:
+        rows = expected.rows if expected.rows is not None else sandbox_manager.expected.row_loader(mission)
+        comparator = MissionComparator(expected.columns, rows, mission.evaluation_options,
+                                       (expected.digest, expected.multiset_digest))
+        cached = _comparators[mission.id] = (expected, mission.evaluation_options_json, comparator)
+    return cached[2]
+
+def evaluate_submission(mission, user_sql):
+    """
+    Run the player's query in their sandbox and judge it against the
+    mission's expected result. Returns a Verdict; SQL errors propagate.
+    """
+    # Expected result precomputed from the mission's pristine data.
+    comparator = get_comparator(mission)
+    # Large results are judged by digest, and large order-insensitive ones
+    # compared inside SQLite, when the query can be wrapped as a subquery.
+    wrappable = is_select(user_sql)
+    by_digest = wrappable and comparator.use_digest
+    in_engine = wrappable and comparator.use_in_engine(current_app.config['EVAL_IN_ENGINE_MIN_ROWS'])
+    judged = None
+    with get_session_sandbox() as sandbox:
+        # Ensure clean DB state for this mission
+        ok, err = ensure_mission_db(mission.id, sandbox)
+        if not ok:
+            raise Exception(err)
+        budget = QueryBudget.for_mission(sandbox_manager.query_budget, mission.evaluation_options)
+        expected_table = sandbox.expected_table(mission.correct_query_script) if in_engine else None
+        # Mission data is loaded once; the attempt itself is rolled back.
+        with sandbox.attempt() if sandbox_manager.reset_mode == 'savepoint' else nullcontext():
+            try:
+                if by_digest:
+                    judged = judge_by_digest(sandbox, comparator, strip_trailing(user_sql), budget)
+                if judged is None and in_engine:
+                    judged = judge_in_engine(sandbox, comparator, strip_trailing(user_sql),
+                                             budget, expected_table)
+            except QueryBudgetExceeded:
+                raise
+            except sqlite3.Error:
+                # Not wrappable as a subquery after all: run it as written.
+                judged = None
+            if judged is None:
+                result = run_player_query(sandbox, user_sql, budget, comparator)
+
+    diff = None
+    if judged is not None:
+        result, verdict = judged
+    else:
+        # A truncated result is judged on the prefix that was fetched, if it decides.
+        verdict = comparator.compare(result.columns, result.rows, complete=result.complete)
+        # Wrong complete results also get a row diff (rows missing, extra, changed).
+        if verdict is not None and not verdict[0] and result.complete:
+            diff = comparator.diff(result.columns, result.rows)
+    if verdict is None:
+        verdict = (False, f"Error: Tu consulta devuelve mas de {len(result.rows)} filas; "
+                          f"se muestran solo las primeras. Revise filtros y JOINs.")
+    if diff is not None:
+        diff = diff_to_json(diff, comparator.correct_columns)
+    return Verdict(result, *verdict, diff)
+
+def store_result(result):
+    """
+    Put a player's result in the session: its first page, plus a result id
+    for the rest when it does not fit in one page.
+    """
+    if len(result.rows) > result_store.page_size:
+        session['result_id'] = result_store.put(result)
+    session['query_results'] = result.json_rows(result_store.page_size)
+    session['column_names'] = list(result.columns)
+    session['results_truncated'] = result.truncated
+    session['results_stopped'] = result.stopped
+    session['result_total'] = len(result.rows)
+
+def discard_stored_result():
+    """Forget the player's previous stored result, if any."""
+    result_id = session.pop('result_id', None)
+    if result_id is not None:
+        result_store.discard(result_id)
+
 # ---------------------------------------------------------------------------
 # Core: build the JSON payload the frontend expects
 # ---------------------------------------------------------------------------
@@ -43,7 +225,8 @@ def setup_mission_db(mission_id):
 def build_state():
     """
     Build and return the complete game-state dict.
-    Also handles session initialisation and DB setup for the current mission.
+    Also handles session initialisation and DB setup for the current mission
+    (skipped when the player's sandbox already holds it untouched).
     Returns (dict, http_status_code).
     """
     all_missions = get_all_missions_from_db()
@@ -63,9 +246,10 @@ def build_state():
 
     # Run setup SQL (only when not in "show results" mode)
     setup_error = None
-    if not show_results:
-        ok, msg = setup_mission_db(current_id)
-        if not ok and current_id <= last_id:
+    if not show_results and current_id <= last_id:
+        with get_session_sandbox() as sandbox:
+            ok, msg = ensure_mission_db(current_id, sandbox)
+        if not ok:
             setup_error = msg
 
     # Determine which mission object to display
@@ -101,6 +285,13 @@ def build_state():
         'mission': mission_data,
         'results': session.get('query_results'),
         'columns': session.get('column_names'),
+        'truncated': session.get('results_truncated', False),
+        # Reading stopped once the verdict was known: total_rows is a lower bound.
+        'stopped': session.get('results_stopped', False),
+        # Rows past the first page are fetched from /api/results/<result_id>.
+        'total_rows': session.get('result_total'),
+        'result_id': session.get('result_id') if 'query_results' in session else None,
+        'diff': session.get('result_diff'),
         'error': session.get('sql_error'),
         'last_query': session.get('last_query', ''),
         'archived_findings': session.get('archived_findings', []),
@@ -110,22 +301,85 @@ def build_state():
     }
 
     # Clear per-request session keys
+    popped = []
     if not show_results:
-        session.pop('query_results', None)
-        session.pop('column_names', None)
-        session.pop('sql_error', None)
+        popped = [session.pop(key, None) for key in ('query_results', 'column_names', 'results_truncated',
+                                                     'results_stopped', 'result_total', 'result_diff',
+                                                     'sql_error')]
+    # Settled: building the state again from this session gives the same state,
+    # so a conditional GET can be answered without building it (see game_state).
+    session['state_settled'] = not (setup_error or state['flash_messages']
+                                    or any(value is not None for value in popped))
 
     return state, 200
 
+def held_state_version():
+    """State version the client says it holds, if any."""
+    return request.headers.get(STATE_VERSION_HEADER) or request.args.get('since')
+
+def current_state_etag():
+    """
+    ETag of the state response this request would get, or None when the
+    state has to be built (a new session, or one with pending changes).
+    """
+    version = session.get('state_version')
+    if version is None or not session.get('state_settled'):
+        return None
+    held_version = held_state_version()
+    # A settled session still holds the rows its state carries.
+    columnar = wants_columnar(len(session.get('query_results') or ()))
+    return state_etag(version, mission_catalog.version(get_all_missions_from_db),
+                      held_version if held_version == version else None, columnar)
+
+def state_response(state, code):
+    """
+    The game state as JSON: only the fields that changed when the client
+    holds the previous version (see state_delta), rows in the columnar
+    encoding if negotiated. GET responses carry an ETag.
+    """
+    etag = None
+    columnar = wants_columnar(len(state.get('results') or ()))
+    if code == 200:
+        state = versioned(state, session, held_state_version())
+        if request.method == 'GET':
+            etag = state_etag(state['state_version'], mission_catalog.version(get_all_missions_from_db),
+                              state.get('delta_from'), columnar)
+    if not columnar:
+        response = jsonify(state)
+    else:
+        if state.get('results') is not None:
+            rows = state['results']
+            width = len(state['columns']) if state.get('columns') is not None else len(rows[0]) if rows else 0
+            state['results'] = encode_rows(rows, width)
+        response = columnar_response(state, code)
+    response.vary.update(('Accept', STATE_VERSION_HEADER))
+    if etag is not None:
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response, code
+
 # ---------------------------------------------------------------------------
 # Routes
 # ---------------------------------------------------------------------------
 
 @main_api_blueprint.route('/game_state', methods=['GET'])
 def game_state():
-    """Returns full game state as JSON — no redirects."""
+    """
+    Returns full game state as JSON — no redirects. A client whose
+    If-None-Match still names the current state gets a bodyless 304,
+    without touching the missions database or the sandbox.
+    """
+    etag = current_state_etag()
+    if etag is not None and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        response.vary.update(('Accept', STATE_VERSION_HEADER, 'Cookie'))
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
     state, code = build_state()
-    return jsonify(state), code
+    return state_response(state, code)
 
 
 @main_api_blueprint.route('/submit_query', methods=['POST'])
@@ -144,47 +398,82 @@ def submit_query():
 
     session['mission_completed_show_results'] = False
     session.pop('sql_error', None)
+    discard_stored_result()
 
     try:
-        # Ensure clean DB state for this mission
-        ok, err = setup_mission_db(current_id)
-        if not ok:
-            raise Exception(err)
-
-        user_proxy = db.session.execute(text(user_sql))
-        user_cols = list(user_proxy.keys()) if user_proxy.returns_rows else []
-        user_rows = [dict(r._mapping) for r in user_proxy.fetchall()] if user_proxy.returns_rows else []
-
-        correct_proxy = db.session.execute(text(mission.correct_query_script))
-        correct_cols = list(correct_proxy.keys())
-        correct_rows = [dict(r._mapping) for r in correct_proxy.fetchall()]
-
-        is_correct, eval_msg = compare_results(
-            user_rows, user_cols, correct_rows, correct_cols, mission.evaluation_options
-        )
-
-        session['query_results'] = user_rows
-        session['column_names'] = user_cols
+        # Identical queries on the same mission data get the same verdict.
+        cache_key = None
+        if verdict_cache.enabled and is_cacheable(user_sql):
+            cache_key = verdict_cache.key(current_id, sandbox_manager.templates.fingerprint(mission),
+                                          mission.correct_query_script, mission.evaluation_options, user_sql)
+        verdict = verdict_cache.get(cache_key) if cache_key else None
+        if verdict is None:
+            verdict = evaluate_submission(mission, user_sql)
+            if cache_key:
+                verdict_cache.put(cache_key, verdict)
+        is_correct, eval_msg = verdict.is_correct, verdict.message
+
+        store_result(verdict.result)
+        session['result_diff'] = verdict.diff
 
         flashes = session.setdefault('_flashes', [])
         if is_correct:
             flashes.append(('success', mission.success_message or "Consulta correcta!"))
             session['mission_completed_show_results'] = True
             session['completed_mission_id_for_display'] = current_id
+            # Warm up the next mission while the player reads the results.
+            next_obj = get_next_mission_from_db(current_id)
+            if next_obj is not None:
+                sandbox_manager.prefetch(next_obj, get_session_sandbox())
         else:
             flashes.append(('warning', eval_msg))
             # Hints are now served on-demand via /get_hint — not shown automatically
 
-    except exc.SQLAlchemyError as e:
-        db.session.rollback()
-        orig = getattr(e, 'orig', e)
-        session['sql_error'] = f"Error de sintaxis o ejecucion: {str(orig).splitlines()[0]}"
+    except QueryBudgetExceeded as e:
+        session['sql_error'] = str(e)
+    except (sqlite3.Error, sqlite3.Warning) as e:
+        session['sql_error'] = f"Error de sintaxis o ejecucion: {str(e).splitlines()[0]}"
     except Exception as e:
-        db.session.rollback()
         session['sql_error'] = f"Error inesperado: {str(e)}"
 
     state, code = build_state()
-    return jsonify(state), code
+    return state_response(state, code)
+
+
+@main_api_blueprint.route('/results/<result_id>', methods=['GET'])
+def result_page(result_id):
+    """
+    Rows [offset, offset + limit) of the player's last stored result.
+    next_offset is None once the last row has been sent.
+    """
+    if result_id != session.get('result_id'):
+        return jsonify({"error": "Resultado no encontrado."}), 404
+    try:
+        offset = int(request.args.get('offset', 0))
+        limit = int(request.args.get('limit', result_store.page_size))
+    except ValueError:
+        return jsonify({"error": "offset y limit deben ser numeros enteros."}), 400
+    if offset < 0 or not 0 < limit <= result_store.max_page_size:
+        return jsonify({"error": f"Se requiere offset >= 0 y 0 < limit <= {result_store.max_page_size}."}), 400
+    page = result_store.page(result_id, offset, limit)
+    if page is None:
+        return jsonify({"error": "El resultado ha caducado. Vuelva a ejecutar la consulta."}), 404
+    end = offset + len(page.rows)
+    columnar = wants_columnar(len(page.rows))
+    payload = {
+        'result_id': result_id,
+        'columns': list(page.columns),
+        'rows': encode_rows(page.rows, len(page.columns)) if columnar else [list(r) for r in page.rows],
+        'offset': offset,
+        'next_offset': end if end < page.total else None,
+        'total_rows': page.total,
+        'truncated': page.truncated,
+    }
+    if columnar:
+        return columnar_response(payload)
+    response = jsonify(payload)
+    response.vary.add('Accept')
+    return response
 
 
 @main_api_blueprint.route('/next_mission', methods=['POST'])
@@ -204,7 +493,12 @@ def next_mission():
     session.pop('completed_mission_id_for_display', None)
     session.pop('query_results', None)
     session.pop('column_names', None)
+    session.pop('results_truncated', None)
+    session.pop('results_stopped', None)
+    session.pop('result_total', None)
+    session.pop('result_diff', None)
     session.pop('sql_error', None)
+    discard_stored_result()
     session['last_query'] = ''
     # Reset hint counter for new mission
     new_id = session.get('current_mission_id', 1)
@@ -214,16 +508,19 @@ def next_mission():
     session.setdefault('_flashes', []).append(('info', 'Nueva directiva recibida.'))
 
     state, code = build_state()
-    return jsonify(state), code
+    return state_response(state, code)
 
 
 @main_api_blueprint.route('/reset_progress', methods=['POST'])
 def reset_progress():
     """Clear all session data and return fresh state."""
+    if session.get('sandbox_id'):
+        sandbox_manager.discard(session['sandbox_id'])
+    discard_stored_result()
     session.clear()
     session.setdefault('_flashes', []).append(('info', 'Progreso de la simulacion reiniciado.'))
     state, code = build_state()
-    return jsonify(state), code
+    return state_response(state, code)
 
 
 @main_api_blueprint.route('/get_hint', methods=['POST'])
@@ -291,6 +588,10 @@ def debug_info():
         'last_query': session.get('last_query', ''),
         'hints_used': session.get('hints_used', {}),
     }
+    info['sandboxes'] = sandbox_manager.stats()
+    info['verdict_cache'] = verdict_cache.stats()
+    info['sessions'] = session_store.stats()
+    info['results'] = result_store.stats()
 
     try:
         import config as cfg
@@ -310,10 +611,12 @@ def admin_execute_sql():
         result_proxy = db.session.execute(text(sql_script))
         if result_proxy.returns_rows:
             columns = list(result_proxy.keys())
-            results = [dict(row._mapping) for row in result_proxy.fetchall()]
+            results = [list(row) for row in result_proxy.fetchall()]
             return jsonify({'results': results, 'columns': columns})
         else:
             db.session.commit()
+            mission_catalog.invalidate()
+            verdict_cache.clear()
             return jsonify({'message': 'Comando ejecutado con exito.'})
     except Exception as e:
         db.session.rollback()
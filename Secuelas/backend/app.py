@@ -4,9 +4,9 @@ from flask import Flask, send_from_directory
 from flask.cli import with_appcontext
 from flask_cors import CORS
 
-from extensions import db
+from extensions import db, mission_catalog, result_store, sandbox_manager, session_store, verdict_cache
 from init_db import initialize_app_database
-from api import main_api_blueprint
+from api import main_api_blueprint, warm_mission_templates
 
 def create_app():
     """
@@ -31,8 +31,59 @@ def create_app():
     app_instance.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     print(f"create_app: Using DATABASE_URL: {app_instance.config['SQLALCHEMY_DATABASE_URI']}")
 
+    # Player sandboxes: in-memory by default; set SANDBOX_DIR (e.g. /dev/shm/secuelas)
+    # to back them with files on a tmpfs instead.
+    app_instance.config['SANDBOX_DIR'] = os.environ.get('SANDBOX_DIR')
+    app_instance.config['SANDBOX_MAX_SESSIONS'] = int(os.environ.get('SANDBOX_MAX_SESSIONS', 500))
+    app_instance.config['SANDBOX_IDLE_TTL'] = int(os.environ.get('SANDBOX_IDLE_TTL', 1800))
+    # 'savepoint': load mission data once and roll back every attempt.
+    # 'restore': reload the mission template before every attempt.
+    app_instance.config['SANDBOX_RESET_MODE'] = os.environ.get('SANDBOX_RESET_MODE', 'savepoint')
+    # Table blocks shared by several missions are stored once, read-only, and
+    # attached to the sandboxes that need them (empty string disables it).
+    app_instance.config['SANDBOX_BASE_DIR'] = os.environ.get('SANDBOX_BASE_DIR', os.path.join(instance_path, 'sandbox_base'))
+    app_instance.config['SANDBOX_BASE_MMAP_SIZE'] = int(os.environ.get('SANDBOX_BASE_MMAP_SIZE', 16 * 1024 * 1024))
+    # Per-query limits for player SQL (0 disables a limit). Missions can
+    # override them with max_query_ms / max_query_instructions in evaluation_options.
+    app_instance.config['QUERY_MAX_MS'] = int(os.environ.get('QUERY_MAX_MS', 2000))
+    app_instance.config['QUERY_MAX_INSTRUCTIONS'] = int(os.environ.get('QUERY_MAX_INSTRUCTIONS', 20_000_000))
+    # Caps on what a player query may return; the rest is not even fetched.
+    app_instance.config['RESULT_MAX_ROWS'] = int(os.environ.get('RESULT_MAX_ROWS', 1000))
+    app_instance.config['RESULT_MAX_BYTES'] = int(os.environ.get('RESULT_MAX_BYTES', 256 * 1024))
+    # Order-insensitive missions whose expected result has at least this many rows
+    # are compared inside SQLite (0 disables it; "compare_in_engine" overrides per mission).
+    # It is slower than comparing in Python but keeps the player's rows out of
+    # memory, so by default it only starts where RESULT_MAX_ROWS stops Python
+    # from fetching a complete result.
+    app_instance.config['EVAL_IN_ENGINE_MIN_ROWS'] = int(os.environ.get(
+        'EVAL_IN_ENGINE_MIN_ROWS', app_instance.config['RESULT_MAX_ROWS'] + 1))
+    # Expected results with more rows than this are kept as digests only.
+    app_instance.config['EXPECTED_MAX_ROWS'] = int(os.environ.get('EXPECTED_MAX_ROWS', 5000))
+    # Warm pool of ready mission sandboxes (0 disables it).
+    app_instance.config['SANDBOX_POOL_MAX_BYTES'] = int(os.environ.get('SANDBOX_POOL_MAX_BYTES', 8 * 1024 * 1024))
+    app_instance.config['SANDBOX_POOL_PER_MISSION'] = int(os.environ.get('SANDBOX_POOL_PER_MISSION', 2))
+    # Verdicts shared between players for repeated queries (0 disables it).
+    app_instance.config['VERDICT_CACHE_MAX_BYTES'] = int(os.environ.get('VERDICT_CACHE_MAX_BYTES', 4 * 1024 * 1024))
+    # Sessions are kept server-side ('server') with only an id in the cookie;
+    # 'cookie' keeps Flask's signed-cookie sessions.
+    app_instance.config['SESSION_STORE'] = os.environ.get('SESSION_STORE', 'server')
+    app_instance.config['SESSION_DB_PATH'] = os.environ.get('SESSION_DB_PATH', os.path.join(instance_path, 'sessions.db'))
+    app_instance.config['SESSION_TTL'] = int(os.environ.get('SESSION_TTL', 7 * 24 * 3600))
+    app_instance.config['SESSION_CACHE_MAX_BYTES'] = int(os.environ.get('SESSION_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+    # Seconds between batched session writes (0 writes each session with its response).
+    # Only for a single worker process: other workers would read stale sessions.
+    app_instance.config['SESSION_WRITE_BEHIND'] = float(os.environ.get('SESSION_WRITE_BEHIND', 0))
+    # Query results longer than one page are kept server-side for RESULT_STORE_TTL
+    # seconds; the game state carries the first RESULT_PAGE_SIZE rows and the
+    # terminal fetches the rest from /api/results/<id>.
+    app_instance.config['RESULT_STORE_PATH'] = os.environ.get('RESULT_STORE_PATH', os.path.join(instance_path, 'results.db'))
+    app_instance.config['RESULT_STORE_TTL'] = int(os.environ.get('RESULT_STORE_TTL', 3600))
+    app_instance.config['RESULT_STORE_MAX_BYTES'] = int(os.environ.get('RESULT_STORE_MAX_BYTES', 16 * 1024 * 1024))
+    app_instance.config['RESULT_PAGE_SIZE'] = int(os.environ.get('RESULT_PAGE_SIZE', 100))
+    app_instance.config['RESULT_PAGE_MAX_SIZE'] = int(os.environ.get('RESULT_PAGE_MAX_SIZE', 1000))
+
     # --- Initialize Extensions ---
-    print("create_app: Initializing extensions (CORS, SQLAlchemy)...")
+    print("create_app: Initializing extensions (CORS, SQLAlchemy, sandboxes, verdict cache, sessions, results, catalog)...")
     # In production Flask serves the React build from the same origin, so CORS
     # is only needed for local development (two separate ports).
     cors_origins_raw = os.environ.get(
@@ -43,10 +94,15 @@ def create_app():
         app_instance,
         supports_credentials=True,
         origins=cors_origins,
-        allow_headers=["Content-Type"],
+        allow_headers=["Content-Type", "X-State-Version", "If-None-Match"],
         methods=["GET", "POST", "OPTIONS"],
     )
     db.init_app(app_instance)
+    sandbox_manager.init_app(app_instance)
+    verdict_cache.init_app(app_instance)
+    session_store.init_app(app_instance)
+    result_store.init_app(app_instance)
+    mission_catalog.init_app(app_instance)
     print("create_app: Extensions initialized.")
 
     # --- Register Blueprints ---
@@ -54,6 +110,17 @@ def create_app():
     app_instance.register_blueprint(main_api_blueprint, url_prefix='/api')
     print(f"create_app: Blueprint registered at /api.")
 
+    # --- Mission templates ---
+    # Build every mission's database image once so player sandboxes can be
+    # reset with a single deserialize. Missing tables (e.g. before `flask
+    # init-db`) are fine: templates are then built lazily on first use.
+    with app_instance.app_context():
+        try:
+            warm_mission_templates()
+            print(f"create_app: Mission templates ready ({sandbox_manager.templates.stats()['templates']}).")
+        except Exception as e:
+            print(f"create_app: Mission templates will be built on demand ({e.__class__.__name__}).")
+
     # --- Register CLI Commands ---
     # This is the correct way to add custom commands to a Flask app factory.
     # The command will be aware of the application context.
@@ -0,0 +1,78 @@
+# Secuelas/backend/benchmarks/bench_campaign.py
+"""
+Time to walk a clean sandbox through the whole campaign (missions 1..20 in
+order) with each reload strategy:
+
+  replay  - run every setup_sql statement (the original behaviour)
+  restore - deserialize each mission's template
+  migrate - apply the precomputed delta from the previous mission, falling
+            back to restore when there is none
+
+    cd backend && python benchmarks/bench_campaign.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from sandbox import Sandbox, MissionTemplates  # noqa: E402
+
+ROUNDS = 50
+
+
+class Mission:
+    def __init__(self, data):
+        self.id = data['id']
+        self.setup_sql = data['setup_sql']
+        self.setup_sql_script = ";\n".join(data['setup_sql'])
+
+
+def run(missions, templates, strategy):
+    sandbox = Sandbox('bench', mmap_size=templates.base.mmap_size)
+    per_mission = {m.id: 0.0 for m in missions}
+    for _ in range(ROUNDS):
+        sandbox.wipe()
+        for mission in missions:
+            template = templates.template(mission)
+            start = time.perf_counter()
+            if strategy == 'replay':
+                sandbox.load_mission(mission.id, mission.setup_sql)
+            elif strategy == 'restore':
+                sandbox.restore(mission.id, template)
+            else:
+                delta = None
+                if sandbox.fingerprint is not None:
+                    if sandbox.fingerprint == template.fingerprint:
+                        delta = []
+                    else:
+                        delta = templates.delta(sandbox.fingerprint, template)
+                if delta is None:
+                    sandbox.restore(mission.id, template)
+                else:
+                    sandbox.migrate(mission.id, template, delta)
+            per_mission[mission.id] += time.perf_counter() - start
+    sandbox.close()
+    return {k: v / ROUNDS for k, v in per_mission.items()}
+
+
+def main():
+    missions = [Mission(m) for m in config.MISSIONS]
+    for label, base_dir in (("sin base compartida", None), ("con base compartida", tempfile.mkdtemp())):
+        templates = MissionTemplates()
+        templates.base.directory = base_dir
+        templates.build_all(missions)
+        results = {s: run(missions, templates, s) for s in ('replay', 'restore', 'migrate')}
+        print(f"\nCampaña completa ({label}), promedio de {ROUNDS} recorridos:")
+        print("  mision    replay   restore   migrate   (us)")
+        for mission in missions:
+            print(f"  {mission.id:>6} " + " ".join(f"{results[s][mission.id] * 1e6:9.1f}"
+                                               for s in ('replay', 'restore', 'migrate')))
+        print("   total " + " ".join(f"{sum(results[s].values()) * 1e6:9.1f}"
+                                    for s in ('replay', 'restore', 'migrate')))
+
+
+if __name__ == '__main__':
+    main()
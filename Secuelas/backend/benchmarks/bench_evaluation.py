@@ -0,0 +1,181 @@
+# Secuelas/backend/benchmarks/bench_evaluation.py
+"""
+Per-submission evaluation cost: rows converted to dicts and judged with
+compare_results (options parsed and expected rows normalized on every call)
+versus cursor tuples judged by a MissionComparator compiled once.
+
+For order-insensitive missions it also compares fetching the whole player
+result into Python (Counter) with materializing it in the sandbox and
+comparing inside SQLite (compare_in_engine): SQLite is slower at every size
+and only saves memory, which is why EVAL_IN_ENGINE_MIN_ROWS defaults to just
+above RESULT_MAX_ROWS. For large expected results it compares keeping their
+rows against keeping only their digest (match_digest), to place
+EXPECTED_MAX_ROWS.
+
+Finally, row-by-row comparison against the NumPy column comparison on an
+aggregation-shaped result (text key plus SUM/COUNT/MAX columns), to place
+evaluation.NUMPY_MIN_ROWS. Ordered exact comparison is not measured: it
+never takes the NumPy path.
+
+    cd backend && python benchmarks/bench_evaluation.py
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import evaluation  # noqa: E402
+from evaluation import MissionComparator, compare_results  # noqa: E402
+from results import ResultSet, fetch_capped  # noqa: E402
+from sandbox import PLAYER_TABLE, Sandbox  # noqa: E402
+
+COLUMNS = ['id', 'nombre', 'departamento', 'salario']
+
+
+def make_rows(n):
+    return [(i, f'empleado {i}', f'depto {i % 7}', 1000.0 + i) for i in range(n)]
+
+
+def bench(n, eval_options):
+    rows = make_rows(n)
+    expected = make_rows(n)  # equal values, distinct objects
+    repeat = max(3, 20000 // max(n, 1))
+
+    def with_dicts():
+        user = [dict(zip(COLUMNS, r)) for r in rows]
+        correct = [dict(zip(COLUMNS, r)) for r in expected]
+        return compare_results(user, COLUMNS, correct, COLUMNS, eval_options)
+
+    comparator = MissionComparator(COLUMNS, expected, eval_options)
+    assert with_dicts()[0] and comparator.compare(COLUMNS, rows)[0]
+
+    old = timeit.timeit(with_dicts, number=repeat) / repeat
+    new = timeit.timeit(lambda: comparator.compare(COLUMNS, rows), number=repeat) / repeat
+    print(f"  {n:>6} filas: dicts + compare_results {old * 1e6:10.1f} us | "
+          f"MissionComparator {new * 1e6:9.1f} us  (x{old / new:.0f})")
+
+
+def bench_in_engine(n, display_rows=1000):
+    sandbox = Sandbox('bench')
+    sandbox.conn.execute("CREATE TABLE empleados (id INTEGER PRIMARY KEY, nombre TEXT, departamento TEXT, salario REAL)")
+    sandbox.conn.executemany("INSERT INTO empleados VALUES (?, ?, ?, ?)", make_rows(n))
+    sandbox.fingerprint = 'bench'
+    correct_sql = "SELECT * FROM empleados"
+    user_sql = "SELECT * FROM empleados ORDER BY salario DESC"
+    comparator = MissionComparator(COLUMNS, sandbox.conn.execute(correct_sql).fetchall(), {'order_matters': False})
+    expected_table = sandbox.expected_table(correct_sql)
+    repeat = max(3, 2000 // max(n, 1))
+
+    def in_python():
+        result = ResultSet.from_cursor(sandbox.execute(user_sql))
+        return comparator.compare(result.columns, result.rows)
+
+    def in_engine():
+        columns = sandbox.result_columns(user_sql)
+        sandbox.materialize(PLAYER_TABLE, user_sql)
+        verdict = comparator.compare_in_engine(columns, sandbox.query_internal, PLAYER_TABLE, expected_table)
+        fetch_capped(sandbox.internal_cursor(f'SELECT * FROM temp."{PLAYER_TABLE}"'), display_rows, float('inf'))
+        sandbox.drop_internal(PLAYER_TABLE)
+        return verdict
+
+    assert in_python()[0] and in_engine()[0]
+    python = timeit.timeit(in_python, number=repeat) / repeat
+    engine = timeit.timeit(in_engine, number=repeat) / repeat
+    python_peak, engine_peak = peak_memory(in_python), peak_memory(in_engine)
+    sandbox.close()
+    print(f"  {n:>6} filas: Python (Counter) {python * 1e3:8.2f} ms {python_peak / 1e6:7.2f} MB"
+          f" | SQLite {engine * 1e3:8.2f} ms {engine_peak / 1e6:7.2f} MB")
+
+
+def bench_digest(n, order_matters, display_rows=1000):
+    sandbox = Sandbox('bench')
+    sandbox.conn.execute("CREATE TABLE empleados (id INTEGER PRIMARY KEY, nombre TEXT, departamento TEXT, salario REAL)")
+    sandbox.conn.executemany("INSERT INTO empleados VALUES (?, ?, ?, ?)", make_rows(n))
+    correct_sql = "SELECT * FROM empleados ORDER BY id"
+    user_sql = "SELECT id, nombre, departamento, salario FROM empleados ORDER BY salario"
+    expected_rows = sandbox.conn.execute(correct_sql).fetchall()
+    options = {'order_matters': order_matters}
+    with_rows = MissionComparator(COLUMNS, expected_rows, options)
+    digests = tuple(sandbox.result_digest(correct_sql, len(COLUMNS), ordered=o) for o in (True, False))
+    digest_only = MissionComparator(COLUMNS, lambda: expected_rows, options, digests)
+    repeat = max(3, 2000 // max(n, 1))
+
+    def rows_in_python():
+        result = ResultSet.from_cursor(sandbox.execute(user_sql))
+        return with_rows.compare(result.columns, result.rows)
+
+    def by_digest():
+        columns = sandbox.result_columns(user_sql)
+        verdict = digest_only.match_digest(
+            columns, lambda indices, ordered: sandbox.result_digest(user_sql, len(columns), indices, ordered))
+        ResultSet.from_cursor(sandbox.execute(user_sql), display_rows)
+        return verdict
+
+    assert rows_in_python()[0] and by_digest()[0]
+    python = timeit.timeit(rows_in_python, number=repeat) / repeat
+    digest = timeit.timeit(by_digest, number=repeat) / repeat
+    python_peak, digest_peak = peak_memory(rows_in_python), peak_memory(by_digest)
+    kept = ResultSet(tuple(COLUMNS), expected_rows, False).nbytes()
+    sandbox.close()
+    print(f"  {n:>6} filas: filas en Python {python * 1e3:8.2f} ms {python_peak / 1e6:7.2f} MB"
+          f" (+~{kept / 1e6:.2f} MB esperadas) | digest {digest * 1e3:8.2f} ms {digest_peak / 1e6:7.2f} MB")
+
+
+def make_totals(n):
+    return [(f'depto {i}', 1000.5 * i, i % 50, 99.25 + i) for i in range(n)]
+
+
+def bench_numpy(n, options):
+    columns = ['departamento', 'gasto_total', 'num_transacciones', 'mayor_gasto']
+    expected, found = make_totals(n), make_totals(n)
+    if options.get('float_tolerance'):
+        found = [(d, total + options['float_tolerance'] / 2, count, top) for d, total, count, top in found]
+    if not options.get('order_matters', True):
+        found.reverse()
+    repeat = max(3, 20000 // max(n, 1))
+    timings = []
+    for min_rows in (float('inf'), 0):
+        evaluation.NUMPY_MIN_ROWS = min_rows
+        comparator = MissionComparator(columns, expected, options)
+        assert comparator.compare(columns, found)[0]
+        timings.append(timeit.timeit(lambda: comparator.compare(columns, found), number=repeat) / repeat)
+    python, vectorized = timings
+    print(f"  {n:>6} filas: fila a fila {python * 1e3:8.3f} ms | NumPy {vectorized * 1e3:8.3f} ms  (x{python / vectorized:.1f})")
+
+
+def peak_memory(fn):
+    """Peak Python heap allocated by one call, in bytes."""
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+if __name__ == '__main__':
+    for label, options in (('order_matters=True', {'order_matters': True}),
+                           ('order_matters=False, column_order_matters=False',
+                            {'order_matters': False, 'column_order_matters': False})):
+        print(label)
+        for n in (10, 1000, 10000):
+            bench(n, options)
+    print('order_matters=False: fetch + compare en Python vs dentro de SQLite')
+    for n in (100, 500, 1000, 5000, 20000, 100000):
+        bench_in_engine(n)
+    for order_matters in (True, False):
+        print(f'order_matters={order_matters}: filas esperadas en memoria vs sólo su digest')
+        for n in (1000, 5000, 20000, 100000):
+            bench_digest(n, order_matters)
+    if evaluation.np is not None:
+        default_min_rows = evaluation.NUMPY_MIN_ROWS
+        for label, options in (('order_matters=False', {'order_matters': False}),
+                               ('order_matters=False, float_tolerance=0.01',
+                                {'order_matters': False, 'float_tolerance': 0.01}),
+                               ('order_matters=True, float_tolerance=0.01',
+                                {'order_matters': True, 'float_tolerance': 0.01})):
+            print(f'{label}: fila a fila vs NumPy por columnas')
+            for n in (20, 50, 100, 1000, 10000, 100000):
+                bench_numpy(n, options)
+        evaluation.NUMPY_MIN_ROWS = default_min_rows
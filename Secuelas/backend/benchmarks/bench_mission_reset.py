@@ -0,0 +1,37 @@
+# Secuelas/backend/benchmarks/bench_mission_reset.py
+"""
+Per-request sandbox reset latency: replaying a mission's setup statements
+versus restoring its pre-built template image.
+
+    cd backend && python benchmarks/bench_mission_reset.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from sandbox import Sandbox, MissionTemplate, MissionTemplates  # noqa: E402
+
+REPEAT = 200
+
+
+def bench(mission):
+    statements = mission['setup_sql']
+    sandbox = Sandbox('bench')
+    template = MissionTemplate(MissionTemplates.build(statements), (), None, tuple(statements))
+
+    replay = timeit.timeit(lambda: sandbox.load_mission(mission['id'], statements), number=REPEAT)
+    restore = timeit.timeit(lambda: sandbox.restore(mission['id'], template), number=REPEAT)
+    sandbox.close()
+
+    print(f"mision {mission['id']:>2} ({len(statements)} sentencias, imagen {len(template.image)} bytes)")
+    print(f"  replay setup_sql : {replay / REPEAT * 1e6:9.1f} us/reset")
+    print(f"  restore template : {restore / REPEAT * 1e6:9.1f} us/reset  (x{replay / restore:.1f})")
+
+
+if __name__ == '__main__':
+    missions = {m['id']: m for m in config.MISSIONS}
+    for mission_id in (1, 20):
+        bench(missions[mission_id])
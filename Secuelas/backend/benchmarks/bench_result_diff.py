@@ -0,0 +1,59 @@
+# Secuelas/backend/benchmarks/bench_result_diff.py
+"""
+Cost of the row diff shown for wrong answers (result_diff.diff_rows) on
+typical mistakes, from 1k to 100k rows, next to the plain comparison that
+decides the verdict. The time per row should stay flat as results grow.
+
+    cd backend && python benchmarks/bench_result_diff.py
+"""
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluation import MissionComparator  # noqa: E402
+from result_diff import diff_rows  # noqa: E402
+
+COLUMNS = ['id', 'nombre', 'departamento', 'salario']
+
+
+def make_rows(n):
+    return [(i, f'empleado {i}', f'depto {i % 7}', 1000.0 + i) for i in range(n)]
+
+
+def one_cell(rows):
+    rows[len(rows) // 2] = rows[len(rows) // 2][:3] + (0.0,)
+    return rows
+
+
+def one_percent_missing(rows):
+    return [r for i, r in enumerate(rows) if i % 100 != 50]
+
+
+def all_different(rows):
+    return [(r[0] + len(rows),) + r[1:] for r in rows]
+
+
+def reordered(rows):
+    random.Random(0).shuffle(rows)
+    return rows
+
+
+MISTAKES = (('una celda', one_cell), ('1% de filas faltan', one_percent_missing),
+            ('todas distintas', all_different), ('orden cambiado', reordered))
+
+if __name__ == '__main__':
+    for ordered in (True, False):
+        print(f'order_matters={ordered}')
+        for label, mistake in MISTAKES:
+            for n in (1000, 10000, 100000):
+                expected = make_rows(n)
+                found = mistake(make_rows(n))
+                comparator = MissionComparator(COLUMNS, expected, {'order_matters': ordered})
+                repeat = max(3, 100000 // n)
+                compare = timeit.timeit(lambda: comparator.compare(COLUMNS, found), number=repeat) / repeat
+                diff = timeit.timeit(lambda: diff_rows(expected, found, ordered), number=repeat) / repeat
+                print(f'  {label:<20} {n:>6} filas: compare {compare * 1e3:8.2f} ms | '
+                      f'diff {diff * 1e3:8.2f} ms ({diff / n * 1e9:5.0f} ns/fila)')
@@ -0,0 +1,58 @@
+# Secuelas/backend/benchmarks/bench_session_store.py
+"""
+Cost of one request's session round trip (open_session + save_session) for
+a session holding a page of query results, with Flask's signed cookies and
+with the server-side SessionStore (write-through and write-behind), plus
+the size of the Cookie header each one makes the browser send back.
+
+    cd backend && python benchmarks/bench_session_store.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+REPEAT = 500
+
+
+def make_app(store, write_behind=0):
+    app = Flask(__name__)
+    app.config.update(SECRET_KEY='bench', SESSION_STORE=store, SESSION_WRITE_BEHIND=write_behind,
+                      SESSION_DB_PATH=os.path.join(tempfile.mkdtemp(), 'sessions.db'))
+    SessionStore().init_app(app)
+    return app
+
+
+def round_trip(app, rows, cookie):
+    """One request reading the session and storing a new page of results."""
+    headers = {'Cookie': f'session={cookie}'} if cookie else {}
+    with app.test_request_context('/', headers=headers):
+        interface = app.session_interface
+        session = interface.open_session(app, request)
+        session['query_results'] = rows
+        session['last_query'] = 'SELECT * FROM empleados'
+        response = app.response_class()
+        interface.save_session(app, session, response)
+        set_cookie = response.headers.get('Set-Cookie', '')
+        return set_cookie.split(';', 1)[0].partition('=')[2] or cookie
+
+
+if __name__ == '__main__':
+    # Werkzeug warns about the oversized cookie; the table below reports it.
+    warnings.filterwarnings('ignore', message="The 'session' cookie is too large")
+    for n in (10, 100, 1000):
+        rows = [[i, f'empleado {i}', f'depto {i % 7}', 1000.0 + i] for i in range(n)]
+        for label, app in (('cookie firmada', make_app('cookie')),
+                           ('servidor', make_app('server')),
+                           ('servidor diferido', make_app('server', write_behind=1))):
+            cookie = round_trip(app, rows, None)
+            seconds = timeit.timeit(lambda: round_trip(app, rows, cookie), number=REPEAT) / REPEAT
+            note = ' (el navegador la descarta: > 4 KB)' if len(cookie) > 4000 else ''
+            print(f'  {n:>5} filas  {label:<18} {seconds * 1e3:7.3f} ms/petición | '
+                  f'Cookie {len(cookie):>7} bytes{note}')
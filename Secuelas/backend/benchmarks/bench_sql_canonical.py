@@ -0,0 +1,47 @@
+# Secuelas/backend/benchmarks/bench_sql_canonical.py
+"""
+Cost of identifying a player query: canonicalize() and fingerprint() on every
+mission's correct query (fingerprints also when memoized), next to a plain
+whitespace normalization.
+
+    cd backend && python benchmarks/bench_sql_canonical.py
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from sql_canonical import canonicalize, fingerprint  # noqa: E402
+
+REPEAT = 2000
+
+
+def whitespace_only(sql):
+    return re.sub(r'\s+', ' ', sql).strip().rstrip(';')
+
+
+def lower_outside_strings(sql):
+    parts = sql.split("'")
+    return "'".join(p.lower() if i % 2 == 0 else p for i, p in enumerate(parts))
+
+
+def per_call_us(fn, queries):
+    total = timeit.timeit(lambda: [fn(q) for q in queries], number=REPEAT)
+    return total / REPEAT / len(queries) * 1e6
+
+
+if __name__ == '__main__':
+    queries = [m['correct_query'] for m in config.MISSIONS]
+    # What players actually send: lower case, extra spaces, comments, ';'.
+    variants = [f"/* intento */ {lower_outside_strings(q)}  ;\n" for q in queries]
+    sizes = sorted(len(q) for q in queries)
+    print(f"{len(queries)} consultas de mision, {sizes[0]}-{sizes[-1]} caracteres")
+    print(f"  whitespace only : {per_call_us(whitespace_only, queries):7.2f} us/consulta")
+    print(f"  canonicalize    : {per_call_us(canonicalize, queries):7.2f} us/consulta")
+    print(f"  fingerprint     : {per_call_us(fingerprint.__wrapped__, queries):7.2f} us/consulta")
+    print(f"  ... memoizada   : {per_call_us(fingerprint, queries):7.2f} us/consulta")
+    same = sum(fingerprint(q) == fingerprint(v) for q, v in zip(queries, variants))
+    print(f"  variantes con la misma huella: {same}/{len(queries)}")
@@ -0,0 +1,50 @@
+# Secuelas/backend/benchmarks/bench_wire_format.py
+"""
+Size and serialization time of a result payload in the default encoding
+(row arrays through jsonify) and in the columnar encoding
+(wire_format.encode_rows + columnar_response), for an employee listing with
+repeated department/role/clearance values. Gzipped sizes are shown too,
+for deployments that compress responses.
+
+    cd backend && python benchmarks/bench_wire_format.py
+"""
+import gzip
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from wire_format import columnar_response, encode_rows  # noqa: E402
+
+COLUMNS = ['id', 'nombre', 'departamento', 'cargo', 'nivel_acceso', 'fecha_ingreso', 'clasificacion']
+DEPARTMENTS = ['Dirección', 'Archivo', 'Propaganda', 'Seguridad', 'Sistemas', 'Comunicación']
+ROLES = ['Analista', 'Archivero', 'Supervisor', 'Técnico', 'Redactor']
+LEVELS = ['PÚBLICO', 'RESERVADO', 'CONFIDENCIAL', 'SECRETO']
+
+
+def make_rows(n):
+    return [(i, f'Empleado {i}', DEPARTMENTS[i % 6], ROLES[i % 5], i % 4 + 1,
+             f'19{80 + i % 20}-0{i % 9 + 1}-1{i % 10}', LEVELS[i % 4]) for i in range(n)]
+
+
+def default_body(rows):
+    return jsonify({'columns': COLUMNS, 'results': [list(r) for r in rows]}).get_data()
+
+
+def columnar_body(rows):
+    return columnar_response({'columns': COLUMNS, 'results': encode_rows(rows, len(COLUMNS))}).get_data()
+
+
+if __name__ == '__main__':
+    app = Flask(__name__)
+    with app.test_request_context():
+        for n in (100, 200, 1000, 10000):
+            rows = make_rows(n)
+            repeat = max(5, 20000 // n)
+            for label, body in (('filas JSON', default_body), ('columnar', columnar_body)):
+                data = body(rows)
+                seconds = timeit.timeit(lambda: body(rows), number=repeat) / repeat
+                print(f'  {n:>6} filas  {label:<11} {len(data):>9} bytes '
+                      f'(gzip {len(gzip.compress(data)):>7}) | {seconds * 1e3:7.2f} ms')
@@ -0,0 +1,64 @@
+# Secuelas/backend/catalog.py
+"""
+Version of the mission catalog, for validating cached game states.
+
+The version is a digest of what the game state shows of each active
+mission (id, title, coordinator message). Computing it reads the missions
+table, so it is cached, and re-checking it costs one os.stat(): when the
+application database is a SQLite file, any write to it (init-db, an admin
+statement, from any worker process) changes the file's mtime or size, and
+only then is the digest recomputed. For other databases the cached digest
+is kept until invalidate() is called.
+"""
+import hashlib
+import os
+import threading
+
+from sqlalchemy.engine import make_url
+
+
+class MissionCatalog:
+    def __init__(self, app=None):
+        self.path = None
+        self._digest = None
+        self._stamp = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        database = url.database if url.get_backend_name() == 'sqlite' else None
+        if database and database != ':memory:' and not database.startswith('file:'):
+            self.path = database if os.path.isabs(database) else os.path.join(app.instance_path, database)
+
+    def _file_stamp(self):
+        if self.path is None:
+            return None
+        stamp = []
+        for path in (self.path, self.path + '-wal'):
+            try:
+                st = os.stat(path)
+            except OSError:
+                stamp.append(None)
+                continue
+            stamp.append((st.st_mtime_ns, st.st_size))
+        return tuple(stamp)
+
+    def version(self, load_missions):
+        """Current catalog digest; load_missions() returns the active missions."""
+        stamp = self._file_stamp()
+        with self._lock:
+            if self._digest is not None and stamp == self._stamp:
+                return self._digest
+        digest = hashlib.blake2b(digest_size=8)
+        for m in load_missions():
+            digest.update(repr((m.id, m.title, m.coordinator_message_subject,
+                                m.coordinator_message_body)).encode())
+        with self._lock:
+            self._digest, self._stamp = digest.hexdigest(), stamp
+            return self._digest
+
+    def invalidate(self):
+        with self._lock:
+            self._digest = None
@@ -1,4 +1,21 @@
 # Secuelas/evaluation.py
+from collections import Counter
+from operator import itemgetter
+
+from result_diff import diff_rows
+from result_digest import row_count
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él todo se compara fila a fila.
+    np = None
+
+# A partir de cuántas filas se comparan las columnas como arrays NumPy
+# (ver benchmarks/bench_evaluation.py).
+NUMPY_MIN_ROWS = 100
+# Los enteros de este valor absoluto en adelante no son exactos en float64.
+_FLOAT_EXACT = 2 ** 53
+
 
 def _normalize_row(row_dict, column_names_ordered):
     """
@@ -14,119 +31,495 @@ def _normalize_row(row_dict, column_names_ordered):
 
     return tuple(row_dict.get(col_name) for col_name in column_names_ordered)
 
-def compare_results(user_results, user_columns, correct_results, correct_columns, eval_options):
+
+def _values_close(a, b, tolerance):
+    """Igualdad de valores; un REAL y otro número son iguales si difieren en a lo sumo tolerance."""
+    if a == b:
+        return True
+    return ((type(a) is float or type(b) is float) and isinstance(a, (int, float))
+            and isinstance(b, (int, float)) and abs(a - b) <= tolerance)
+
+
+def _rows_close(a, b, tolerance):
+    return len(a) == len(b) and all(_values_close(x, y, tolerance) for x, y in zip(a, b))
+
+
+def _sort_key(row):
+    # NULL < números < texto < blobs, como ordena SQLite; nunca compara tipos distintos.
+    return tuple((0, 0) if v is None else (1, v) if isinstance(v, (int, float))
+                 else (2, v) if isinstance(v, str) else (3, v) for v in row)
+
+
+def _numeric_array(values):
     """
-    Compara los resultados de la consulta del usuario con los resultados correctos.
-    Devuelve (bool_es_correcto, mensaje_string)
+    Array int64/float64 con los valores si todos son INTEGER/REAL y se
+    representan exactos en float64; si no, None.
     """
-    user_results = user_results or []
-    correct_results = correct_results or []
-    user_columns_processed = [str(c).lower() for c in (user_columns or [])] # Nombres de columna a minúsculas
-    correct_columns_processed = [str(c).lower() for c in (correct_columns or [])]
-
-    # 1. Comprobar nombres de columnas (si es necesario)
-    if eval_options.get('check_column_names', True):
-        if eval_options.get('column_order_matters', True):
-            if user_columns_processed != correct_columns_processed:
-                return False, f"Error: Los nombres o el orden de las columnas no coinciden. Se esperaba: {correct_columns}, Resultado: {user_columns}"
-        else:  # El orden de las columnas no importa, pero los nombres deben coincidir
-            if set(user_columns_processed) != set(correct_columns_processed):
-                # Proporcionar más detalles sobre qué columnas faltan o sobran
-                missing_in_user = set(correct_columns_processed) - set(user_columns_processed)
-                extra_in_user = set(user_columns_processed) - set(correct_columns_processed)
-                error_msg = "Error: El conjunto de nombres de columna no coincide."
-                if missing_in_user:
-                    error_msg += f" Faltan columnas en tu resultado: {missing_in_user}."
-                if extra_in_user:
-                    error_msg += f" Hay columnas adicionales en tu resultado: {extra_in_user}."
-                return False, error_msg
-    
-    # Usar correct_columns_processed como el orden canónico para la comparación de datos
-    # si check_column_names es falso, o si el orden de columnas del usuario no importa pero los nombres sí.
-    # Si el orden de columnas del usuario importa y los nombres también, ya se validó arriba.
-    # Si los nombres de las columnas no importan en absoluto (raro, pero posible), la comparación de datos es más compleja.
-    # Por ahora, asumimos que si check_column_names es True, correct_columns_processed es la referencia.
-    # Si check_column_names es False, la comparación de datos es inherentemente más ambigua sin un mapeo.
-    # Para este juego, es probable que check_column_names sea casi siempre True.
-
-    # Normalizar filas a tuplas para comparación, usando el orden de correct_columns_processed
     try:
-        # Asegurarse de que las filas del usuario se normalizan usando el orden de las columnas correctas,
-        # especialmente si el orden de las columnas del usuario no importaba pero los nombres sí.
-        # Si los nombres de las columnas del usuario eran diferentes y check_column_names era False, esto fallaría.
-        # Asumimos que si check_column_names es True, las columnas del usuario (potencialmente reordenadas) coinciden con las correctas.
-        
-        # Para la normalización de user_results, necesitamos usar user_columns para extraer los datos
-        # y luego, si column_order_matters es False, reordenarlos según correct_columns.
-        # Si column_order_matters es True, user_columns ya debe ser igual a correct_columns.
-
-        # Normalizamos los datos del usuario según SUS PROPIAS columnas primero.
-        temp_user_data_tuples = []
-        for row in user_results:
-            # Convertir RowProxy a dict si es necesario, o manejarlo directamente
-            row_dict = row if isinstance(row, dict) else dict(row._mapping if hasattr(row, '_mapping') else row)
-            temp_user_data_tuples.append(tuple(row_dict.get(str(col).lower()) for col in user_columns))
-
-        # Si el orden de las columnas del usuario no importa pero los nombres sí,
-        # necesitamos remapear las tuplas del usuario al orden de las columnas correctas.
-        user_data_tuples_for_comparison = []
-        if not eval_options.get('column_order_matters', True) and eval_options.get('check_column_names', True):
-            # Crear un mapeo de índice de columna correcta a índice de columna de usuario
-            user_col_idx_map = {name: i for i, name in enumerate(user_columns_processed)}
-            for user_tuple in temp_user_data_tuples:
-                reordered_tuple = []
-                for correct_col_name in correct_columns_processed:
-                    user_idx = user_col_idx_map.get(correct_col_name)
-                    if user_idx is not None:
-                         reordered_tuple.append(user_tuple[user_idx])
-                    else: # Esto no debería pasar si los sets de columnas coinciden
-                         reordered_tuple.append(None) 
-                user_data_tuples_for_comparison.append(tuple(reordered_tuple))
-        else: # El orden de columnas del usuario importa (o no se chequean nombres)
-            user_data_tuples_for_comparison = temp_user_data_tuples
-
-
-        correct_data_tuples = []
-        for row in correct_results:
-            row_dict = row if isinstance(row, dict) else dict(row._mapping if hasattr(row, '_mapping') else row)
-            correct_data_tuples.append(tuple(row_dict.get(str(col).lower()) for col in correct_columns))
-
-    except Exception as e:
-        return False, f"Error interno al procesar los resultados para comparación: {e}"
-
-    # 2. Comprobar número de filas si el orden no importa (si importa, se comprueba con la igualdad de listas)
-    if not eval_options.get('order_matters', True):
-        if len(user_data_tuples_for_comparison) != len(correct_data_tuples):
-            return False, f"Error: El número de filas no coincide. Se esperaba: {len(correct_data_tuples)}, Resultado: {len(user_data_tuples_for_comparison)}"
-
-    # 3. Comparar datos
-    if eval_options.get('order_matters', True):
-        if user_data_tuples_for_comparison != correct_data_tuples:
-            # Encontrar la primera diferencia para un mensaje más útil
-            for i in range(min(len(user_data_tuples_for_comparison), len(correct_data_tuples))):
-                if user_data_tuples_for_comparison[i] != correct_data_tuples[i]:
-                    return False, f"Error: Datos incorrectos en la fila {i+1} (considerando el orden). Se esperaba: {correct_data_tuples[i]}, Resultado: {user_data_tuples_for_comparison[i]}"
-            if len(user_data_tuples_for_comparison) != len(correct_data_tuples): # Diferencia de longitud
-                 return False, f"Error: El número de filas no coincide. Se esperaba: {len(correct_data_tuples)}, Resultado: {len(user_data_tuples_for_comparison)}"
-            return False, "Error: Los datos no coinciden (considerando el orden)."
-    else:
-        # El orden no importa, comparar como multiconjuntos (listas de tuplas ordenadas internamente y luego la lista de listas)
-        # Convertir a una forma canónica para comparación de multiconjuntos: ordenar cada tupla y luego ordenar la lista de tuplas.
-        # No, las tuplas internas no deben ordenarse, solo la lista externa de tuplas.
-        # Usar contadores para manejar duplicados correctamente es más robusto para multiconjuntos.
-        from collections import Counter
-        user_counts = Counter(user_data_tuples_for_comparison)
-        correct_counts = Counter(correct_data_tuples)
-
-        if user_counts != correct_counts:
-            # Encontrar diferencias para dar feedback
-            for item_tuple, count in correct_counts.items():
-                if user_counts[item_tuple] != count:
-                    return False, f"Error: Discrepancia en la fila de datos '{item_tuple}'. Se esperaba {count} vez/veces, se encontró {user_counts[item_tuple]} vez/veces."
-            # Chequear si hay items extra en el resultado del usuario
-            for item_tuple, count in user_counts.items():
-                if correct_counts[item_tuple] != count: # Ya cubierto arriba, pero por si acaso
-                     return False, f"Error: Discrepancia en la fila de datos '{item_tuple}'. Se esperaba {correct_counts[item_tuple]} vez/veces, se encontró {count} vez/veces."
+        array = np.array(values)
+    except (OverflowError, ValueError):
+        return None
+    if array.dtype.kind not in 'if' or (array.size and np.abs(array).max() >= _FLOAT_EXACT):
+        return None
+    return array
+
+
+class _ColumnArrays:
+    """
+    Filas esperadas guardadas por columnas como arrays NumPy, para comparar
+    resultados grandes de forma vectorizada. Las columnas numéricas se
+    comparan por valor (con tolerancia para REAL, si se pidió); las demás se
+    codifican como enteros con un diccionario valor -> código armado con las
+    filas esperadas, así que 1 y 1.0 reciben el mismo código y un valor que
+    no aparece recibe -1. Si el orden no importa, ambas se ordenan con
+    lexsort antes de comparar.
+    """
+
+    def __init__(self, correct_rows, column_count, order_matters, tolerance):
+        self.tolerance = tolerance
+        self.codes = []   # por columna: dict valor -> código, o None si es numérica
+        self.arrays = []
+        for values in (list(zip(*correct_rows)) if correct_rows else [()] * column_count):
+            array = _numeric_array(values)
+            codes = None
+            if array is None:
+                codes = {}
+                for value in values:
+                    codes.setdefault(value, len(codes))
+                array = np.fromiter((codes[v] for v in values), np.int64, len(values))
+            self.codes.append(codes)
+            self.arrays.append(array)
+        # Posición en las filas esperadas de cada fila ordenada.
+        self.order = None
+        if not order_matters:
+            self.order = np.lexsort(self.arrays[::-1])
+            self.arrays = [a[self.order] for a in self.arrays]
+
+    def user_arrays(self, user_columns):
+        """Columnas del jugador (tuplas de valores) como arrays comparables, o None."""
+        arrays = []
+        for values, codes in zip(user_columns, self.codes):
+            if codes is None:
+                array = _numeric_array(values)
+                if array is None:
+                    return None
+            else:
+                get = codes.get
+                array = np.fromiter((get(v, -1) for v in values), np.int64, len(values))
+                if self.tolerance and (array < 0).any():
+                    # Un número desconocido en una columna mixta podría estar dentro de la tolerancia.
+                    return None
+            arrays.append(array)
+        return arrays
+
+    def equal_rows(self, user_arrays, n):
+        """Vector booleano: qué filas de las primeras n coinciden."""
+        equal = np.ones(n, dtype=bool)
+        for expected, found, codes in zip(self.arrays, user_arrays, self.codes):
+            expected, found = expected[:n], found[:n]
+            if codes is None and self.tolerance and 'f' in (expected.dtype.kind, found.dtype.kind):
+                equal &= np.abs(expected - found) <= self.tolerance
+            else:
+                equal &= expected == found
+        return equal
+
+
+def _tuple_getter(indices):
+    """Función fila -> tupla con los valores de esas posiciones (siempre una tupla)."""
+    if len(indices) == 1:
+        index = indices[0]
+        return lambda row: (row[index],)
+    if not indices:
+        return lambda row: ()
+    return itemgetter(*indices)
+
+
+class MissionComparator:
+    """
+    Comparador de resultados compilado una sola vez por misión a partir de sus
+    opciones de evaluación y de su resultado esperado (columnas + filas).
+
+    Las opciones se leen, las columnas esperadas se pasan a minúsculas y las
+    filas esperadas se cuentan (si el orden no importa) al construirlo; cada
+    envío sólo paga la comparación. Las filas del jugador son las tuplas tal
+    como salen del cursor: si el orden de las columnas no importa se
+    reordenan por posición, sin pasar por diccionarios.
+
+    Para resultados grandes correct_rows puede ser una función que devuelve
+    las filas: el comparador no las guarda y se juzga primero por digests
+    (match_digest, con los del resultado esperado); las filas sólo se
+    cargan para explicar una diferencia.
+
+    Con NumPy instalado, los resultados de NUMPY_MIN_ROWS filas o más se
+    comparan por columnas (_ColumnArrays) cuando el orden de las filas no
+    importa o hay tolerancia; con orden y comparación exacta, comparar las
+    listas de tuplas ya es más rápido. La opción float_tolerance hace
+    iguales dos números, si alguno es REAL, cuando difieren en a lo sumo ese
+    valor; sin ella la comparación es exacta.
+    """
+
+    def __init__(self, correct_columns, correct_rows, eval_options, digests=None):
+        eval_options = eval_options or {}
+        self.check_column_names = eval_options.get('check_column_names', True)
+        self.column_order_matters = eval_options.get('column_order_matters', True)
+        self.order_matters = eval_options.get('order_matters', True)
+        # None: decidir según el tamaño del resultado esperado (ver use_in_engine).
+        self.in_engine = eval_options.get('compare_in_engine')
+        self.tolerance = float(eval_options.get('float_tolerance') or 0)
+        self.correct_columns = list(correct_columns or [])
+        self._correct_lower = [str(c).lower() for c in self.correct_columns]
+        # Multiconjunto: una columna repetida debe aparecer las mismas veces.
+        self._correct_names = Counter(self._correct_lower)
+        # digests: (digest ordenado, digest de multiconjunto) del resultado esperado.
+        self.digest = None
+        if digests is not None:
+            self.digest = digests[0] if self.order_matters else digests[1]
+        if callable(correct_rows):
+            self._load_rows = correct_rows
+            self._correct_rows = self._correct_counts = None
+            self.row_count = row_count(self.digest)
+        else:
+            self._load_rows = None
+            self._correct_rows = [tuple(r) for r in correct_rows or []]
+            # Para comparar como multiconjuntos basta con contar las filas esperadas una vez.
+            self._correct_counts = None if self.order_matters else Counter(self._correct_rows)
+            self.row_count = len(self._correct_rows)
+        self._vector = None
+        if (np is not None and self._correct_rows is not None and self.row_count >= NUMPY_MIN_ROWS
+                and (self.tolerance or not self.order_matters)):
+            self._vector = _ColumnArrays(self._correct_rows, len(self.correct_columns),
+                                         self.order_matters, self.tolerance)
+
+    @property
+    def correct_rows(self):
+        """Filas esperadas como tuplas (recalculadas si no se guardan)."""
+        if self._correct_rows is not None:
+            return self._correct_rows
+        return [tuple(r) for r in self._load_rows()]
+
+    def _counts(self, correct_rows):
+        if self._correct_counts is not None:
+            return self._correct_counts
+        return Counter(correct_rows)
+
+    def _check_columns(self, user_columns, user_lower):
+        """Devuelve un mensaje de error si las columnas no coinciden, o None."""
+        if not self.check_column_names:
+            return None
+        if self.column_order_matters:
+            if user_lower != self._correct_lower:
+                return f"Error: Los nombres o el orden de las columnas no coinciden. Se esperaba: {self.correct_columns}, Resultado: {user_columns}"
+            return None
+        user_names = Counter(user_lower)
+        if user_names != self._correct_names:
+            # Proporcionar más detalles sobre qué columnas faltan o sobran
+            missing_in_user = list((self._correct_names - user_names).elements())
+            extra_in_user = list((user_names - self._correct_names).elements())
+            error_msg = "Error: El conjunto de nombres de columna no coincide."
+            if missing_in_user:
+                error_msg += f" Faltan columnas en tu resultado: {missing_in_user}."
+            if extra_in_user:
+                error_msg += f" Hay columnas adicionales en tu resultado: {extra_in_user}."
+            return error_msg
+        return None
+
+    def _column_indices(self, user_lower):
+        """
+        Posiciones de las columnas del jugador en el orden de las esperadas,
+        o None si ya están en ese orden. Con nombres repetidos, la n-ésima
+        columna esperada con un nombre corresponde a la n-ésima del jugador.
+        """
+        if self.column_order_matters or not self.check_column_names:
+            return None
+        positions = {}
+        for i, name in enumerate(user_lower):
+            positions.setdefault(name, []).append(i)
+        indices = [positions[name].pop(0) for name in self._correct_lower]
+        if indices == list(range(len(user_lower))):
+            return None
+        return indices
+
+    def row_key(self, user_lower):
+        """
+        Función que lleva una fila del jugador al orden de las columnas
+        esperadas, o None si ya está en ese orden.
+        """
+        indices = self._column_indices(user_lower)
+        return None if indices is None else _tuple_getter(indices)
+
+    def use_in_engine(self, min_rows):
+        """
+        True si hay que comparar dentro de SQLite (compare_in_engine): sólo
+        cuando el orden de las filas no importa y, salvo que la misión lo
+        fije, el resultado esperado tiene al menos min_rows filas. Es más
+        lento que el Counter, pero no trae las filas del jugador a memoria.
+        """
+        if self.order_matters or self.tolerance:
+            return False
+        if self.in_engine is not None:
+            return bool(self.in_engine)
+        return bool(min_rows) and self.row_count >= min_rows
+
+    @property
+    def use_digest(self):
+        """True si las filas esperadas no se guardan: se juzga primero por digest."""
+        return self._load_rows is not None and self.digest is not None
+
+    def match_digest(self, user_columns, digest_of):
+        """
+        Juzga el resultado del jugador por su digest, sin leer sus filas.
+        digest_of(indices, ordered) calcula el digest del resultado del
+        jugador con sus columnas en ese orden (None: tal como vienen).
+        Devuelve (bool_es_correcto, mensaje_string), o None si hay una
+        diferencia que sólo la comparación fila a fila sabe explicar.
+        """
+        user_columns = list(user_columns or [])
+        user_lower = [str(c).lower() for c in user_columns]
+        error_msg = self._check_columns(user_columns, user_lower)
+        if error_msg:
+            return False, error_msg
+        if len(user_columns) != len(self.correct_columns):
+            return None
+        user_digest = digest_of(self._column_indices(user_lower), self.order_matters)
+        if user_digest == self.digest:
+            return True, "¡Correcto!"
+        user_count = row_count(user_digest)
+        if not self.order_matters and user_count != self.row_count:
+            return False, f"Error: El número de filas no coincide. Se esperaba: {self.row_count}, Resultado: {user_count}"
+        return None
+
+    def compare_in_engine(self, user_columns, query, user_table, expected_table):
+        """
+        Compara como multiconjuntos dos tablas ya materializadas en el
+        sandbox: la del resultado del jugador y la del esperado. Las filas de
+        ambas se agrupan juntas dentro de SQLite sumando +1 por cada fila del
+        jugador y -1 por cada esperada; un grupo con suma distinta de cero es
+        una discrepancia, así que a Python sólo llega la primera.
+        query(sql, params) ejecuta una consulta y devuelve sus filas.
+        Devuelve (bool_es_correcto, mensaje_string)
+        """
+        user_columns = list(user_columns or [])
+        user_lower = [str(c).lower() for c in user_columns]
+        error_msg = self._check_columns(user_columns, user_lower)
+        if error_msg:
+            return False, error_msg
+
+        user_count, correct_count = query(
+            f'SELECT (SELECT count(*) FROM temp."{user_table}"), (SELECT count(*) FROM temp."{expected_table}")')[0]
+        if user_count != correct_count:
+            return False, f"Error: El número de filas no coincide. Se esperaba: {correct_count}, Resultado: {user_count}"
+        if len(user_columns) != len(self.correct_columns):
+            # Sin chequeo de nombres, distinta cantidad de columnas nunca coincide.
             return False, "Error: El contenido de los datos no coincide (sin considerar el orden de las filas, pero sí los duplicados)."
 
-    return True, "¡Correcto!" # Mensaje de éxito genérico, la vista puede usar el de la misión
+        # Columnas por posición (c0, c1, ...), en el orden de las esperadas.
+        indices = self._column_indices(user_lower) or range(len(user_columns))
+        user_defs = ', '.join(f'c{i}' for i in range(len(user_columns)))
+        user_cols = ', '.join(f'c{i}' for i in indices)
+        cols = ', '.join(f'c{i}' for i in range(len(self.correct_columns)))
+        tables = (f'u({user_defs}) AS (SELECT * FROM temp."{user_table}"), '
+                  f'e({cols}) AS (SELECT * FROM temp."{expected_table}")')
+        # El UNION toma los nombres de columna del primer SELECT: va primero e.
+        # GROUP BY trata los NULL como iguales, igual que el Counter.
+        rows = query(
+            f'WITH {tables} SELECT {cols} FROM '
+            f'(SELECT {cols}, -1 AS s FROM e UNION ALL SELECT {user_cols}, 1 FROM u) '
+            f'GROUP BY {cols} HAVING sum(s) != 0 LIMIT 1')
+        if not rows:
+            return True, "¡Correcto!"
+
+        item_tuple = tuple(rows[0])
+        # Cuántas veces aparece esa fila de cada lado.
+        user_match = ' AND '.join(f'c{i} IS ?' for i in indices)
+        correct_match = ' AND '.join(f'c{i} IS ?' for i in range(len(self.correct_columns)))
+        expected_n, found_n = query(
+            f'WITH {tables} SELECT (SELECT count(*) FROM e WHERE {correct_match}), '
+            f'(SELECT count(*) FROM u WHERE {user_match})', item_tuple * 2)[0]
+        return False, f"Error: Discrepancia en la fila de datos '{item_tuple}'. Se esperaba {expected_n} vez/veces, se encontró {found_n} vez/veces."
+
+    def _first_difference(self, user_rows, correct_rows):
+        """Mensaje para la primera fila distinta (considerando el orden), o None."""
+        tolerance = self.tolerance
+        for i in range(min(len(user_rows), len(correct_rows))):
+            if tuple(user_rows[i]) != correct_rows[i] and not (
+                    tolerance and _rows_close(user_rows[i], correct_rows[i], tolerance)):
+                return f"Error: Datos incorrectos en la fila {i+1} (considerando el orden). Se esperaba: {correct_rows[i]}, Resultado: {tuple(user_rows[i])}"
+        return None
+
+    def early_exit(self, user_columns):
+        """
+        Para misiones donde el orden importa: función que, llamada con las
+        filas leídas hasta el momento, indica si el veredicto ya está decidido
+        (una fila distinta o una fila de más), para dejar de leer el cursor.
+        Sólo compara las filas nuevas en cada llamada. None si no aplica.
+        """
+        if not self.order_matters or self.tolerance:
+            return None
+        user_columns = list(user_columns or [])
+        user_lower = [str(c).lower() for c in user_columns]
+        if self._check_columns(user_columns, user_lower):
+            return lambda rows: True
+        row_key = self.row_key(user_lower)
+        correct_rows = self.correct_rows
+        checked = 0
+
+        def decided(rows):
+            nonlocal checked
+            end = len(rows)
+            if end > len(correct_rows):
+                return True
+            if row_key is None:
+                if rows[checked:end] != correct_rows[checked:end]:
+                    return True
+            elif any(row_key(rows[i]) != correct_rows[i] for i in range(checked, end)):
+                return True
+            checked = end
+            return False
+
+        return decided
+
+    def diff(self, user_columns, user_rows):
+        """
+        Diferencia fila a fila entre el resultado completo del jugador y el
+        esperado (filas que faltan, que sobran y celdas distintas), como un
+        result_diff.ResultDiff. None si las columnas no son comparables.
+        """
+        user_columns = list(user_columns or [])
+        user_lower = [str(c).lower() for c in user_columns]
+        if self._check_columns(user_columns, user_lower) or len(user_columns) != len(self.correct_columns):
+            return None
+        row_key = self.row_key(user_lower)
+        user_rows = [tuple(r) for r in user_rows] if row_key is None else [row_key(r) for r in user_rows]
+        return diff_rows(self.correct_rows, user_rows, self.order_matters)
+
+    @staticmethod
+    def _unordered_mismatch(correct_row, user_row):
+        return ("Error: El contenido de los datos no coincide (sin considerar el orden de las filas, pero sí los duplicados)."
+                f" Se esperaba: {correct_row}, Resultado: {user_row}")
+
+    def _compare_columns(self, user_lower, user_rows):
+        """
+        Comparación vectorizada de un resultado completo (ver _ColumnArrays).
+        Devuelve el mismo veredicto que la comparación fila a fila, o None
+        si hay que usar esa (columnas no convertibles, o una diferencia sin
+        orden ni tolerancia, cuyo mensaje sale de los contadores).
+        """
+        if len(user_lower) != len(self.correct_columns):
+            return None
+        indices = self._column_indices(user_lower) or range(len(user_lower))
+        columns = list(zip(*user_rows)) or [()] * len(user_lower)
+        arrays = self._vector.user_arrays([columns[i] for i in indices])
+        if arrays is None:
+            return None
+        row_key = self.row_key(user_lower) or tuple
+        correct_rows = self.correct_rows
+        n, m = len(user_rows), len(correct_rows)
+        if self.order_matters:
+            equal = self._vector.equal_rows(arrays, min(n, m))
+            if not equal.all():
+                i = int(np.argmin(equal))
+                return False, f"Error: Datos incorrectos en la fila {i+1} (considerando el orden). Se esperaba: {correct_rows[i]}, Resultado: {row_key(user_rows[i])}"
+            if n != m:
+                return False, f"Error: El número de filas no coincide. Se esperaba: {m}, Resultado: {n}"
+            return True, "¡Correcto!"
+        if n != m:
+            return False, f"Error: El número de filas no coincide. Se esperaba: {m}, Resultado: {n}"
+        order = np.lexsort(arrays[::-1])
+        equal = self._vector.equal_rows([a[order] for a in arrays], n)
+        if equal.all():
+            return True, "¡Correcto!"
+        if not self.tolerance:
+            return None
+        i = int(np.argmin(equal))
+        return False, self._unordered_mismatch(correct_rows[self._vector.order[i]], row_key(user_rows[order[i]]))
+
+    def compare(self, user_columns, user_rows, complete=True):
+        """
+        Compara el resultado del jugador (columnas + filas como tuplas) con el esperado.
+        complete=False indica que user_rows es sólo un prefijo (quedaban filas
+        sin leer); si ese prefijo no alcanza para decidir, devuelve None.
+        Devuelve (bool_es_correcto, mensaje_string)
+        """
+        user_columns = list(user_columns or [])
+        user_lower = [str(c).lower() for c in user_columns]
+
+        # 1. Comprobar nombres de columnas (si es necesario)
+        error_msg = self._check_columns(user_columns, user_lower)
+        if error_msg:
+            return False, error_msg
+
+        # Resultados grandes: comparar por columnas con NumPy.
+        if complete and self._vector is not None and len(user_rows) >= NUMPY_MIN_ROWS:
+            verdict = self._compare_columns(user_lower, user_rows)
+            if verdict is not None:
+                return verdict
+
+        # Llevar las filas del usuario al orden de las columnas correctas
+        try:
+            row_key = self.row_key(user_lower)
+            if row_key is None:
+                user_rows = user_rows if isinstance(user_rows, list) else list(user_rows or [])
+            else:
+                user_rows = [row_key(row) for row in user_rows or []]
+        except Exception as e:
+            return False, f"Error interno al procesar los resultados para comparación: {e}"
+
+        correct_rows = self.correct_rows
+        if not complete:
+            # Sólo se leyó un prefijo: el resultado completo tiene más filas que user_rows.
+            error_msg = self._first_difference(user_rows, correct_rows) if self.order_matters else None
+            if error_msg:
+                return False, error_msg
+            if len(user_rows) >= len(correct_rows):
+                return False, f"Error: El número de filas no coincide. Se esperaba: {len(correct_rows)}, Resultado: más de {len(user_rows)}"
+            return None
+
+        # 2./3. Comparar datos
+        if self.order_matters:
+            if user_rows != correct_rows:
+                # Encontrar la primera diferencia para un mensaje más útil
+                error_msg = self._first_difference(user_rows, correct_rows)
+                if error_msg:
+                    return False, error_msg
+                if len(user_rows) != len(correct_rows):  # Diferencia de longitud
+                    return False, f"Error: El número de filas no coincide. Se esperaba: {len(correct_rows)}, Resultado: {len(user_rows)}"
+                if not self.tolerance:
+                    return False, "Error: Los datos no coinciden (considerando el orden)."
+        else:
+            if len(user_rows) != len(correct_rows):
+                return False, f"Error: El número de filas no coincide. Se esperaba: {len(correct_rows)}, Resultado: {len(user_rows)}"
+            if self.tolerance:
+                # Con tolerancia no sirve contar: se ordenan ambos y se comparan fila a fila.
+                for user_row, correct_row in zip(sorted(map(tuple, user_rows), key=_sort_key),
+                                                 sorted(correct_rows, key=_sort_key)):
+                    if not _rows_close(user_row, correct_row, self.tolerance):
+                        return False, self._unordered_mismatch(correct_row, user_row)
+                return True, "¡Correcto!"
+            # Usar contadores para manejar duplicados correctamente (multiconjuntos).
+            user_counts = Counter(map(tuple, user_rows))
+            correct_counts = self._counts(correct_rows)
+            if user_counts != correct_counts:
+                # Encontrar diferencias para dar feedback
+                for item_tuple, count in correct_counts.items():
+                    if user_counts[item_tuple] != count:
+                        return False, f"Error: Discrepancia en la fila de datos '{item_tuple}'. Se esperaba {count} vez/veces, se encontró {user_counts[item_tuple]} vez/veces."
+                # Chequear si hay items extra en el resultado del usuario
+                for item_tuple, count in user_counts.items():
+                    if correct_counts[item_tuple] != count:
+                        return False, f"Error: Discrepancia en la fila de datos '{item_tuple}'. Se esperaba {correct_counts[item_tuple]} vez/veces, se encontró {count} vez/veces."
+                return False, "Error: El contenido de los datos no coincide (sin considerar el orden de las filas, pero sí los duplicados)."
+
+        return True, "¡Correcto!"  # Mensaje de éxito genérico, la vista puede usar el de la misión
+
+
+def compare_results(user_results, user_columns, correct_results, correct_columns, eval_options):
+    """
+    Compara los resultados de la consulta del usuario con los resultados correctos.
+    Acepta filas como diccionarios (interfaz original) o como tuplas; para
+    evaluar muchos envíos de la misma misión conviene reutilizar un
+    MissionComparator.
+    Devuelve (bool_es_correcto, mensaje_string)
+    """
+    user_rows = [_normalize_row(r, user_columns) for r in user_results or []]
+    correct_rows = [_normalize_row(r, correct_columns) for r in correct_results or []]
+    return MissionComparator(correct_columns, correct_rows, eval_options).compare(user_columns, user_rows)
@@ -1,4 +1,14 @@
 # Este archivo se crea expresamente para evitar la llamada recurrente entre app.py y models.py
 from flask_sqlalchemy import SQLAlchemy
+from catalog import MissionCatalog
+from result_store import ResultStore
+from sandbox import SandboxManager
+from session_store import SessionStore
+from verdict_cache import VerdictCache
 
-db = SQLAlchemy()
\ No newline at end of file
+db = SQLAlchemy()
+sandbox_manager = SandboxManager()
+verdict_cache = VerdictCache()
+session_store = SessionStore()
+result_store = ResultStore()
+mission_catalog = MissionCatalog()
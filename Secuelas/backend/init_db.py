@@ -1,39 +1,8 @@
 # Secuelas/init_db.py
-from sqlalchemy import text, exc, asc
 from extensions import db
 from models import MissionDefinitionDB # Importar el nuevo modelo
 import json
 
-def execute_sql_script(db_session, sql_statements):
-    """Ejecuta una lista de sentencias SQL dentro de la sesión dada."""
-    if not sql_statements:
-        print("execute_sql_script: No hay sentencias SQL para ejecutar.")
-        return
-    for stmt_index, stmt in enumerate(sql_statements):
-        if stmt and stmt.strip():
-            try:
-                print(f"execute_sql_script: Ejecutando stmt {stmt_index + 1}/{len(sql_statements)}: {stmt[:100]}...")
-                db_session.execute(text(stmt))
-            except exc.SQLAlchemyError as e:
-                print(f"Error ejecutando SQL de configuración: {stmt} - {e}")
-                db_session.rollback()
-                raise
-            except Exception as e:
-                print(f"Error inesperado ejecutando SQL de configuración: {stmt} - {e}")
-                db_session.rollback()
-                raise
-    try:
-        db_session.commit()
-        print("execute_sql_script: Commit exitoso de las sentencias SQL.")
-    except exc.SQLAlchemyError as e:
-        print(f"Error haciendo commit de las sentencias SQL: {e}")
-        db_session.rollback()
-        raise
-    except Exception as e:
-        print(f"Error inesperado haciendo commit de las sentencias SQL: {e}")
-        db_session.rollback()
-        raise
-
 def load_initial_missions_from_config_to_db(db_session):
     """
     Carga las misiones desde el archivo config.py a la tabla MissionDefinitionDB.
@@ -128,7 +97,7 @@ def initialize_app_database(app_context):
     Inicializa la base de datos de la aplicación:
     1. Crea todas las tablas definidas en models.py (incluida MissionDefinitionDB).
     2. Carga las misiones iniciales desde config.py a la BD si la tabla de misiones está vacía.
-    3. Configura la base de datos para la primera misión del juego (si existe alguna misión).
+    Los datos de juego de cada misión se cargan en la sandbox de cada jugador, no aquí.
     """
     with app_context.app_context():
         print("initialize_app_database: Iniciando...")
@@ -143,16 +112,7 @@ def initialize_app_database(app_context):
         print("initialize_app_database: Tablas creadas (o ya existian).")
         load_initial_missions_from_config_to_db(db.session)
 
-        first_mission_from_db = MissionDefinitionDB.query.filter_by(is_active=True).order_by(asc(MissionDefinitionDB.id)).first()
-        
-        if first_mission_from_db:
-            print(f"initialize_app_database: Configurando entorno para la primera mision (ID: {first_mission_from_db.id}) desde la BD...")
-            try:
-                execute_sql_script(db.session, first_mission_from_db.setup_sql)
-                print(f"initialize_app_database: Entorno para la Mision {first_mission_from_db.id} configurado.")
-            except Exception as e:
-                print(f"initialize_app_database: Error configurando el entorno para la primera mision desde la BD: {e}")
-        else:
-            print("initialize_app_database: No hay misiones activas en la base de datos para configurar el entorno inicial del juego.")
-        
+        # Las tablas de cada misión ya no viven en la BD compartida: se crean en
+        # la sandbox privada de cada jugador (ver sandbox.py).
+
         print("initialize_app_database: Finalizado.")
@@ -0,0 +1,193 @@
+# Secuelas/backend/mission_setup.py
+"""
+Static analysis of mission setup scripts.
+
+A mission's setup_sql is a flat list of statements (DROP ... / CREATE TABLE /
+INSERT INTO). Here it is split into per-table groups so that identical blocks
+of data reused by many missions (empleados, registros_acceso, ...) can be
+stored once in a shared, read-only base database instead of being copied into
+every player's sandbox.
+
+Setups are also fingerprinted by content, so missions whose statements
+produce the same data share one template (and a player moving between them
+needs no reload at all), and consecutive setups can be diffed into a short
+migration (setup_delta) instead of a full rebuild.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+from collections import namedtuple
+from urllib.request import pathname2url
+
+from sql_canonical import canonicalize
+
+_CREATE_TABLE_RE = re.compile(
+    r'^\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?["`\[]?(\w+)', re.IGNORECASE)
+_INSERT_RE = re.compile(
+    r'^\s*(?:INSERT|REPLACE)\s+(?:OR\s+\w+\s+)?INTO\s+["`\[]?(\w+)', re.IGNORECASE)
+_DROP_TABLE_RE = re.compile(r'^\s*DROP\s+TABLE\s', re.IGNORECASE)
+
+# A table block shared by at least this many missions goes to the base database.
+MIN_SHARED_MISSIONS = 2
+# SQLite allows 10 attached databases by default; leave room for the player.
+MAX_BASE_ATTACHMENTS = 8
+
+TableGroup = namedtuple('TableGroup', 'table statements')
+
+
+class SetupLayout(namedtuple('SetupLayout', 'drops groups other')):
+    """
+    drops:  DROP TABLE statements (no-ops on a fresh database).
+    groups: TableGroup per table, in order of creation.
+    other:  anything else (indexes, views, triggers, updates...).
+    """
+
+    @property
+    def self_contained(self):
+        """True when the setup is only independent CREATE TABLE + INSERT blocks."""
+        return not self.other
+
+
+def analyze(statements):
+    """Split a list of setup statements into a SetupLayout."""
+    drops, other = [], []
+    groups = {}
+    for stmt in statements:
+        if not stmt or not stmt.strip():
+            continue
+        stmt = stmt.strip()
+        if _DROP_TABLE_RE.match(stmt):
+            drops.append(stmt)
+            continue
+        match = _CREATE_TABLE_RE.match(stmt) or _INSERT_RE.match(stmt)
+        if match is None:
+            other.append(stmt)
+            continue
+        table = match.group(1).lower()
+        if table not in groups and _INSERT_RE.match(stmt):
+            # Inserting into a table this script didn't create: keep it in order.
+            other.append(stmt)
+            continue
+        groups.setdefault(table, []).append(stmt)
+    return SetupLayout(drops, [TableGroup(t, tuple(s)) for t, s in groups.items()], other)
+
+
+def fingerprint(statements):
+    """
+    Content hash of a setup script, insensitive to formatting (see
+    sql_canonical). DROP TABLE statements are ignored: they are no-ops on
+    the fresh database a template is built in.
+    """
+    h = hashlib.sha256()
+    for stmt in statements:
+        if stmt and stmt.strip() and not _DROP_TABLE_RE.match(stmt):
+            h.update(canonicalize(stmt).encode('utf-8'))
+            h.update(b'\0')
+    return h.hexdigest()
+
+
+def setup_delta(old_statements, new_statements):
+    """
+    Statements that turn a database built from old_statements into one built
+    from new_statements: unchanged tables are kept, tables that only gained
+    rows get the extra INSERTs, everything else is dropped and recreated.
+    Returns None when either setup isn't plain CREATE TABLE + INSERT blocks.
+    """
+    old, new = analyze(old_statements), analyze(new_statements)
+    if not (old.self_contained and new.self_contained):
+        return None
+    old_groups = {g.table: g.statements for g in old.groups}
+    new_tables = {g.table for g in new.groups}
+    delta = [f'DROP TABLE main."{t}"' for t in old_groups if t not in new_tables]
+    for group in new.groups:
+        previous = old_groups.get(group.table)
+        if previous == group.statements:
+            continue
+        if previous and group.statements[:len(previous)] == previous:
+            delta.extend(group.statements[len(previous):])
+            continue
+        if previous:
+            delta.append(f'DROP TABLE main."{group.table}"')
+        delta.extend(group.statements)
+    return delta
+
+
+def block_key(group):
+    """Content hash identifying a table block across missions."""
+    digest = hashlib.sha256('\n'.join(group.statements).encode('utf-8')).hexdigest()
+    return f"{group.table}-{digest[:16]}"
+
+
+def find_shared_blocks(setups, min_missions=MIN_SHARED_MISSIONS):
+    """Return {block_key: TableGroup} for blocks used by >= min_missions setups."""
+    usage, blocks = {}, {}
+    for statements in setups:
+        layout = analyze(statements)
+        if not layout.self_contained:
+            continue
+        for group in layout.groups:
+            key = block_key(group)
+            blocks[key] = group
+            usage[key] = usage.get(key, 0) + 1
+    return {k: g for k, g in blocks.items() if usage[k] >= min_missions}
+
+
+class BaseStore:
+    """
+    Immutable SQLite files holding one shared table block each, named after
+    the block's content hash so every worker process can build them
+    independently and reuse whatever is already on disk.
+    """
+
+    def __init__(self, directory=None, mmap_size=16 * 1024 * 1024):
+        self.directory = directory
+        self.mmap_size = mmap_size
+        self.blocks = {}
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def publish(self, blocks):
+        """Write every block that is not on disk yet and remember it."""
+        os.makedirs(self.directory, exist_ok=True)
+        for key, group in blocks.items():
+            path = self.path(key)
+            if not os.path.exists(path):
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                conn = sqlite3.connect(tmp_path, isolation_level=None)
+                try:
+                    conn.execute("BEGIN")
+                    for stmt in group.statements:
+                        conn.execute(stmt)
+                    conn.execute("COMMIT")
+                finally:
+                    conn.close()
+                os.replace(tmp_path, path)
+            self.blocks[key] = group
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.db")
+
+    def split(self, statements):
+        """
+        Return (local_statements, attachments) for a setup: the statements
+        that still have to be materialized in the sandbox, and the
+        (schema_name, uri) pairs of base blocks to attach read-only instead.
+        """
+        if not self.blocks:
+            return list(statements), ()
+        layout = analyze(statements)
+        if not layout.self_contained:
+            # Views/triggers in main can't see attached tables: keep it all local.
+            return list(statements), ()
+        local, attachments = list(layout.drops), []
+        for group in layout.groups:
+            key = block_key(group)
+            if key in self.blocks and len(attachments) < MAX_BASE_ATTACHMENTS:
+                uri = f"file:{pathname2url(self.path(key))}?mode=ro&immutable=1"
+                attachments.append((f"base_{group.table}", uri))
+            else:
+                local.extend(group.statements)
+        return local, tuple(attachments)
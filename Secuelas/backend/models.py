@@ -1,5 +1,6 @@
 # Secuelas/models.py
-from extensions import db
+from extensions import db, sandbox_manager, verdict_cache
+from sqlalchemy import event
 import datetime
 import json # Para serializar/deserializar las opciones de evaluación
 
@@ -59,6 +60,18 @@ class MissionDefinitionDB(db.Model):
     def __repr__(self):
         return f'<MissionDefinitionDB {self.id}: {self.title}>'
 
+
+# Los resultados esperados de cada misión se calculan una sola vez (ver
+# sandbox.ExpectedResults) y los veredictos se comparten entre jugadores (ver
+# verdict_cache); si la fila cambia, se descartan y se recalculan la próxima
+# vez que se necesiten.
+@event.listens_for(MissionDefinitionDB, 'after_insert')
+@event.listens_for(MissionDefinitionDB, 'after_update')
+@event.listens_for(MissionDefinitionDB, 'after_delete')
+def _invalidar_resultados_esperados(mapper, connection, target):
+    sandbox_manager.expected.invalidate(target.id)
+    verdict_cache.invalidate_mission(target.id)
+
 # Los modelos Employee, Document, DocumentAccessLog que tenías antes
 # probablemente no sean necesarios aquí si cada misión define sus propias tablas
 # a través de setup_sql. Si son para una estructura base de la aplicación,
@@ -0,0 +1,121 @@
+# Secuelas/backend/result_diff.py
+"""
+Row-level difference between an expected result and a player's result, for
+feedback on wrong answers.
+
+diff_rows() reports the expected rows the player is missing, the rows they
+have in excess, and, for a missing row and an extra row that are the same
+record (same value in the first column, or same position in an ordered
+result), the cells that differ. Ordered results whose rows are all present
+but out of place report the first misplaced row instead.
+
+The two results are walked in step to skip their common prefix and suffix
+(a merge over both sequences), and the rows left in between are matched by
+hashing, so the cost is linear in the number of rows. Every list is capped
+at max_items entries; the counts are always exact.
+"""
+from collections import Counter, defaultdict, namedtuple
+
+MAX_ITEMS = 10
+
+# missing/extra: [(row number or None, row), ...]; changed: [(row number,
+# column index, expected value, found value), ...]. Row numbers are 1-based:
+# positions in the player's result, except for missing rows (positions in the
+# expected result, None when order does not matter). moved: (row number,
+# expected row, found row) of the first misplaced row, or None.
+ResultDiff = namedtuple('ResultDiff', 'missing missing_count extra extra_count changed changed_count moved')
+
+
+def _common_bounds(expected, found):
+    """Length of the common prefix, and of the common suffix after it."""
+    limit = min(len(expected), len(found))
+    start = 0
+    while start < limit and expected[start] == found[start]:
+        start += 1
+    end = 0
+    while end < limit - start and expected[-1 - end] == found[-1 - end]:
+        end += 1
+    return start, end
+
+
+def _unmatched(rows, start, other_counts):
+    """
+    [(index, row)] of the rows not matched by a row of the other side;
+    other_counts (a Counter of the other side) is consumed.
+    """
+    result = []
+    append = result.append
+    get = other_counts.get
+    for i, row in enumerate(rows, start):
+        count = get(row)
+        if count:
+            other_counts[row] = count - 1
+        else:
+            append((i, row))
+    return result
+
+
+def diff_rows(expected, found, ordered=True, max_items=MAX_ITEMS):
+    """
+    Difference between two lists of row tuples with the same columns, in the
+    same column order. Returns a ResultDiff.
+    """
+    start, end = _common_bounds(expected, found)
+    expected_middle = expected[start:len(expected) - end]
+    found_middle = found[start:len(found) - end]
+    missing = _unmatched(expected_middle, start, Counter(found_middle))
+    extra = _unmatched(found_middle, start, Counter(expected_middle))
+
+    moved = None
+    if ordered and not missing and not extra and expected_middle:
+        moved = (start + 1, expected[start], found[start])
+
+    # Pair a missing row with an extra row that looks like the same record.
+    pairs = []
+    if missing and extra and len(missing[0][1]) > 1:
+        by_key = defaultdict(list)
+        for position, row in reversed(extra):
+            by_key[row[0]].append((position, row))
+        by_position = {position: row for position, row in extra} if ordered else {}
+        paired = set()
+        unpaired = []
+        for position, row in missing:
+            candidates = by_key.get(row[0])
+            while candidates and candidates[-1][0] in paired:
+                candidates.pop()
+            if candidates:
+                match = candidates.pop()
+            elif position in by_position and position not in paired:
+                match = (position, by_position[position])
+            else:
+                unpaired.append((position, row))
+                continue
+            paired.add(match[0])
+            pairs.append((row, match))
+        missing = unpaired
+        extra = [item for item in extra if item[0] not in paired]
+
+    changed, changed_count = [], 0
+    for expected_row, (position, found_row) in pairs:
+        for column, (want, got) in enumerate(zip(expected_row, found_row)):
+            if want != got:
+                changed_count += 1
+                if len(changed) < max_items:
+                    changed.append((position + 1, column, want, got))
+
+    return ResultDiff(
+        [(position + 1 if ordered else None, row) for position, row in missing[:max_items]], len(missing),
+        [(position + 1, row) for position, row in extra[:max_items]], len(extra),
+        changed, changed_count, moved)
+
+
+def diff_to_json(diff, columns):
+    """JSON-ready form of a ResultDiff; rows are arrays matched to columns."""
+    return {
+        'columns': list(columns),
+        'missing': [[n, list(row)] for n, row in diff.missing], 'missing_count': diff.missing_count,
+        'extra': [[n, list(row)] for n, row in diff.extra], 'extra_count': diff.extra_count,
+        'changed': [[n, columns[c], want, got] for n, c, want, got in diff.changed],
+        'changed_count': diff.changed_count,
+        'moved': None if diff.moved is None else [diff.moved[0], list(diff.moved[1]), list(diff.moved[2])],
+    }
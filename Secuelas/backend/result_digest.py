@@ -0,0 +1,87 @@
+# Secuelas/backend/result_digest.py
+"""
+Digests of query results, computed inside SQLite by two aggregates that
+every sandbox connection registers:
+
+    secuelas_digest(c0, c1, ...)           order-sensitive
+    secuelas_multiset_digest(c0, c1, ...)  order-insensitive, duplicates count
+
+Both take a whole row as their arguments and return "<rows>:<hex digest>".
+Values are told apart the way the comparator tells them apart: 1 and 1.0
+are the same value, 'a' and x'61' are not. Two results with the same digest
+are equal as the evaluator would judge them, so a large expected result can
+be kept as its digest and a player's result checked in one pass with O(1)
+memory. digest_sql() builds the query that feeds a result to them.
+
+The order-sensitive digest hashes the rows in sequence; the multiset digest
+adds up a 128-bit hash of each row, which does not depend on row order.
+"""
+import hashlib
+import marshal
+
+ORDERED = 'secuelas_digest'
+UNORDERED = 'secuelas_multiset_digest'
+
+_MASK = (1 << 128) - 1
+
+
+def encode_row(row):
+    """Bytes identifying a row up to the comparator's equality."""
+    if float in map(type, row):
+        row = tuple(int(v) if type(v) is float and v.is_integer() else v for v in row)
+    return marshal.dumps(row)
+
+
+class OrderedDigest:
+    def __init__(self):
+        self.rows = 0
+        self.hash = hashlib.blake2b(digest_size=16)
+
+    def step(self, *row):
+        self.rows += 1
+        # Marshalled tuples are self-delimiting: their concatenation is unambiguous.
+        self.hash.update(encode_row(row))
+
+    def finalize(self):
+        return f'{self.rows}:{self.hash.hexdigest()}'
+
+
+class MultisetDigest:
+    def __init__(self):
+        self.rows = 0
+        self.sum = 0
+
+    def step(self, *row):
+        self.rows += 1
+        self.sum += int.from_bytes(hashlib.blake2b(encode_row(row), digest_size=16).digest(), 'big')
+
+    def finalize(self):
+        return f'{self.rows}:{self.sum & _MASK:032x}'
+
+
+def register(conn):
+    """Make the digest aggregates available on a sqlite3 connection."""
+    conn.create_aggregate(ORDERED, -1, OrderedDigest)
+    conn.create_aggregate(UNORDERED, -1, MultisetDigest)
+
+
+# Digests of an empty result (SQLite returns NULL when no row was aggregated).
+EMPTY = {ORDERED: OrderedDigest().finalize(), UNORDERED: MultisetDigest().finalize()}
+
+
+def digest_sql(select_sql, column_count, indices=None, ordered=True):
+    """
+    Query returning the digest of select_sql's result. indices lists the
+    result's columns in the order they are hashed (all of them by default).
+    An ORDER BY inside select_sql is honoured: SQLite keeps a subquery's
+    order when its only consumer is an aggregate.
+    """
+    function = ORDERED if ordered else UNORDERED
+    names = ', '.join(f'c{i}' for i in range(column_count))
+    args = ', '.join(f'c{i}' for i in (range(column_count) if indices is None else indices))
+    return f"WITH r({names}) AS ({select_sql}) SELECT coalesce({function}({args}), '{EMPTY[function]}') FROM r"
+
+
+def row_count(digest):
+    """Number of rows a digest was computed over."""
+    return int(digest.partition(':')[0])
@@ -0,0 +1,228 @@
+# Secuelas/backend/result_store.py
+"""
+Player query results kept server-side under a result id, read back a page
+at a time.
+
+A submission stores its ResultSet here and the game state only carries the
+first page plus the total row count; the terminal asks for the rest through
+/api/results/<id>?offset=&limit=. Results are immutable, so any copy of one
+is current: each process keeps the results it stored in an LRU charged by
+size (RESULT_STORE_MAX_BYTES), sharing the row tuples with the verdict
+cache, and every result is also written to a SQLite file (ResultDB) so a
+page request served by another worker process finds it.
+
+On disk a result is split into chunks of CHUNK_ROWS rows encoded as JSON
+(blobs as hex; not pickle, for the reason given in session_store); a page
+only reads and decodes the chunks it overlaps. Results expire
+RESULT_STORE_TTL seconds after they were stored and expired ones are purged
+periodically.
+"""
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+CHUNK_ROWS = 256
+
+# result: the ResultSet; expires: time.time() deadline.
+StoredResult = namedtuple('StoredResult', 'result expires')
+
+# A slice of a stored result: rows are tuples from offset on; total is the
+# number of rows in the whole result.
+ResultPage = namedtuple('ResultPage', 'columns rows offset total truncated')
+
+
+def _encode_blob(value):
+    # Rows only hold SQLite values, and blobs are the one JSON lacks.
+    if isinstance(value, bytes):
+        return {'blob': value.hex()}
+    raise TypeError(f"Valor no serializable en un resultado: {type(value).__name__}")
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':'), default=_encode_blob)
+
+
+def _loads(text):
+    # The only objects in a stored result are encoded blobs.
+    return json.loads(text, object_hook=lambda obj: bytes.fromhex(obj['blob']))
+
+
+class ResultDB:
+    """results(id, expires, columns, total, truncated) plus result_chunks(id, chunk, rows) in a SQLite file."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS results ('
+                           'id TEXT PRIMARY KEY, expires REAL NOT NULL, columns BLOB NOT NULL, '
+                           'total INTEGER NOT NULL, truncated INTEGER NOT NULL)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS result_chunks ('
+                           'id TEXT NOT NULL, chunk INTEGER NOT NULL, rows BLOB NOT NULL, '
+                           'PRIMARY KEY (id, chunk)) WITHOUT ROWID')
+        self._lock = threading.Lock()
+
+    def write(self, result_id, stored):
+        result = stored.result
+        chunks = [(result_id, i // CHUNK_ROWS, _dumps(result.rows[i:i + CHUNK_ROWS]))
+                  for i in range(0, len(result.rows), CHUNK_ROWS)]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('INSERT OR REPLACE INTO results (id, expires, columns, total, truncated) '
+                                   'VALUES (?, ?, ?, ?, ?)',
+                                   (result_id, stored.expires, _dumps(result.columns),
+                                    len(result.rows), int(result.truncated)))
+                self._conn.executemany('INSERT OR REPLACE INTO result_chunks (id, chunk, rows) VALUES (?, ?, ?)',
+                                       chunks)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def page(self, result_id, offset, limit, now):
+        """ResultPage read from disk, or None if the result is unknown or expired."""
+        with self._lock:
+            head = self._conn.execute('SELECT columns, total, truncated FROM results WHERE id = ? AND expires > ?',
+                                      (result_id, now)).fetchone()
+            if head is None:
+                return None
+            first, last = offset // CHUNK_ROWS, (offset + limit - 1) // CHUNK_ROWS
+            chunks = self._conn.execute('SELECT rows FROM result_chunks WHERE id = ? AND chunk BETWEEN ? AND ? '
+                                        'ORDER BY chunk', (result_id, first, last)).fetchall() if limit else []
+        columns, total, truncated = head
+        try:
+            rows = [tuple(row) for (text,) in chunks for row in _loads(text)]
+            columns = tuple(_loads(columns))
+        except (ValueError, KeyError, TypeError):
+            # Not a result this version wrote (e.g. pickled chunks): treat it as expired.
+            return None
+        start = offset - first * CHUNK_ROWS
+        return ResultPage(columns, rows[start:start + limit], offset, total, bool(truncated))
+
+    def delete(self, result_id):
+        with self._lock:
+            self._conn.execute('DELETE FROM result_chunks WHERE id = ?', (result_id,))
+            self._conn.execute('DELETE FROM results WHERE id = ?', (result_id,))
+
+    def purge(self, now):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.execute('DELETE FROM result_chunks WHERE id IN '
+                                   '(SELECT id FROM results WHERE expires <= ?)', (now,))
+                purged = self._conn.execute('DELETE FROM results WHERE expires <= ?', (now,)).rowcount
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return purged
+
+
+class ResultStore:
+    """LRU of stored results in front of ResultDB, with TTL expiry."""
+
+    def __init__(self, app=None):
+        self.path = None
+        self.ttl = 3600
+        self.max_bytes = 16 * 1024 * 1024
+        self.page_size = 100
+        self.max_page_size = 1000
+        self.purge_interval = 600
+        self.db = None
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # result_id -> (StoredResult, size)
+        self._bytes = 0
+        self._last_purge = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config.get('RESULT_STORE_PATH') or os.path.join(app.instance_path, 'results.db')
+        self.ttl = app.config.get('RESULT_STORE_TTL', self.ttl)
+        self.max_bytes = app.config.get('RESULT_STORE_MAX_BYTES', self.max_bytes)
+        self.page_size = app.config.get('RESULT_PAGE_SIZE', self.page_size)
+        self.max_page_size = app.config.get('RESULT_PAGE_MAX_SIZE', self.max_page_size)
+        self.db = ResultDB(self.path)
+
+    @staticmethod
+    def new_id():
+        return secrets.token_urlsafe(16)
+
+    def put(self, result):
+        """Store a ResultSet and return its id."""
+        result_id = self.new_id()
+        stored = StoredResult(result, time.time() + self.ttl)
+        self.db.write(result_id, stored)
+        with self._lock:
+            self.stored += 1
+            self._cache_locked(result_id, stored)
+        self._maybe_purge()
+        return result_id
+
+    def page(self, result_id, offset=0, limit=None):
+        """ResultPage for rows [offset, offset + limit), or None if unknown or expired."""
+        limit = self.page_size if limit is None else limit
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and entry[0].expires > now:
+                self._entries.move_to_end(result_id)
+                self.hits += 1
+                result = entry[0].result
+                return ResultPage(result.columns, result.rows[offset:offset + limit], offset,
+                                  len(result.rows), result.truncated)
+            self.misses += 1
+        return self.db.page(result_id, offset, limit, now)
+
+    def discard(self, result_id):
+        with self._lock:
+            entry = self._entries.pop(result_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+        self.db.delete(result_id)
+
+    def _cache_locked(self, result_id, stored):
+        size = stored.result.nbytes()
+        if size > self.max_bytes:
+            return
+        self._entries[result_id] = (stored, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        with self._lock:
+            for result_id in [k for k, (stored, _) in self._entries.items() if stored.expires <= now]:
+                self._bytes -= self._entries.pop(result_id)[1]
+        try:
+            self.db.purge(now)
+        except sqlite3.Error as e:
+            print(f"ResultStore: limpieza de resultados caducados fallida: {e}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'result_store': self.path, 'results_cached': len(self._entries),
+                    'results_cache_bytes': self._bytes, 'results_cache_max_bytes': self.max_bytes,
+                    'results_stored': self.stored, 'results_hits': self.hits, 'results_misses': self.misses,
+                    'results_hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                    'results_evictions': self.evictions}
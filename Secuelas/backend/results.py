@@ -0,0 +1,82 @@
+# Secuelas/backend/results.py
+"""
+Query results as one compact type: the column labels plus the row tuples
+exactly as sqlite3 returns them. A result goes from the cursor to the
+evaluator, the caches and the JSON payload without building a dict per row,
+so duplicate column names (two "id" columns from a JOIN) keep their own
+values.
+
+In the game state a result is sent as "columns": [...] and
+"results": [[...], ...]; rows are arrays matched to the columns by position.
+Only the first page travels with the state, the rest is served from
+result_store.
+"""
+from collections import namedtuple
+
+FETCH_BATCH_SIZE = 256
+
+
+def row_size(row):
+    """Rough in-memory size of a result row, in bytes."""
+    return 16 + sum(len(v) if isinstance(v, (str, bytes)) else 8 for v in row)
+
+
+def fetch_capped(cursor, max_rows, max_bytes, stop=None):
+    """
+    Fetch rows in batches until max_rows rows or about max_bytes bytes, or
+    until stop(rows), called after every batch, returns True.
+    Returns (rows, truncated, stopped): truncated means the caps left rows
+    unread, stopped that stop() did.
+    """
+    rows, size = [], 0
+    while True:
+        batch = cursor.fetchmany(FETCH_BATCH_SIZE)
+        if not batch:
+            return rows, False, False
+        for row in batch:
+            size += row_size(row)
+            if len(rows) >= max_rows or size > max_bytes:
+                return rows, True, False
+            rows.append(row)
+        if stop is not None and stop(rows):
+            return rows, False, cursor.fetchone() is not None
+
+
+class ResultSet(namedtuple('ResultSet', 'columns rows truncated stopped', defaults=(False,))):
+    """
+    columns:   tuple of column labels, duplicates included.
+    rows:      list of row tuples, in cursor order.
+    truncated: True when RESULT_MAX_ROWS / RESULT_MAX_BYTES cut the result.
+    stopped:   True when fetching ended early because the verdict was
+               already decided (the result has more rows).
+    """
+    __slots__ = ()
+
+    @property
+    def complete(self):
+        return not (self.truncated or self.stopped)
+
+    @classmethod
+    def from_cursor(cls, cursor, max_rows=None, max_bytes=None, stop=None):
+        """
+        Read a cursor's result, capped when max_rows/max_bytes are given.
+        stop is an optional callable stop(columns) -> predicate(rows) (or
+        None) used to end the fetch early, see fetch_capped.
+        """
+        columns = tuple(d[0] for d in cursor.description) if cursor.description else ()
+        if not columns:
+            return cls(columns, [], False)
+        stop = stop(columns) if stop is not None else None
+        if max_rows is None and max_bytes is None and stop is None:
+            return cls(columns, cursor.fetchall(), False)
+        rows, truncated, stopped = fetch_capped(cursor, max_rows if max_rows is not None else float('inf'),
+                                                max_bytes if max_bytes is not None else float('inf'), stop)
+        return cls(columns, rows, truncated, stopped)
+
+    def nbytes(self):
+        """Rough in-memory size of the whole result, in bytes."""
+        return 64 + sum(16 + len(c) for c in self.columns) + sum(row_size(r) for r in self.rows)
+
+    def json_rows(self, limit=None):
+        """The first limit rows (all by default) as JSON arrays."""
+        return [list(r) for r in self.rows[:limit]]
@@ -0,0 +1,965 @@
+# Secuelas/backend/sandbox.py
+"""
+Per-session SQLite sandboxes.
+
+Every player gets a private SQLite database where the current mission's
+setup SQL is executed and where their queries run. The shared application
+database (db.session) is only used for mission metadata, so players never
+see each other's data and never contend for the same write lock.
+
+Mission setups are materialized once into template databases and kept as
+serialized images; a sandbox is reset by deserializing the image instead of
+replaying every DROP/CREATE/INSERT statement.
+
+In the default "savepoint" reset mode the mission data is loaded once per
+sandbox and every player attempt runs inside a savepoint that is always
+rolled back, so retries don't touch the template at all.
+
+Each sandbox also registers an authorizer that flags it dirty as soon as a
+write (INSERT/UPDATE/DELETE or any DDL) is compiled against it, so a mission
+reload only happens when the data may actually have changed. The same
+authorizer refuses ATTACH, DETACH and PRAGMAs (other than schema
+introspection) in player statements.
+
+A bounded SandboxPool keeps ready-to-use connections already hydrated with a
+mission's data, prefetched in the background when a player is about to need
+them (e.g. right after completing the previous mission).
+
+Templates are content-addressed: missions whose setups have the same
+fingerprint share one template, one pool entry, and a sandbox holding that
+data can switch between them without being reloaded. A clean sandbox moving
+to a different dataset is migrated with the precomputed delta between the
+two setups when that is cheaper than a restore, which in practice means
+when only the attached base databases differ.
+
+Player statements can run under a QueryBudget (wall-clock and VM
+instructions) enforced with SQLite's progress handler, so a runaway
+cartesian join or recursive CTE is cancelled instead of pinning a worker.
+
+The output of each mission's correct_query depends only on its setup, so it
+is computed once per template (ExpectedResults) instead of being re-run in
+the player's sandbox on every submission. Large results are kept only as
+digests (see result_digest), which every connection can compute in SQLite.
+
+Table blocks shared by several missions live in immutable base databases
+(see mission_setup.BaseStore) that are ATTACHed read-only to every sandbox
+that needs them. Sandboxes only hold the mission-specific tables, plus a
+private copy of a base table if the player writes to it (copy-on-write).
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import result_digest
+from mission_setup import BaseStore, find_shared_blocks, fingerprint, setup_delta
+from sql_canonical import exact_fingerprint, fingerprint as query_fingerprint, strip_trailing
+
+RESET_MODES = ('savepoint', 'restore')
+
+_WRITE_ACTIONS = frozenset({
+    sqlite3.SQLITE_INSERT, sqlite3.SQLITE_UPDATE, sqlite3.SQLITE_DELETE,
+    sqlite3.SQLITE_CREATE_TABLE, sqlite3.SQLITE_CREATE_TEMP_TABLE,
+    sqlite3.SQLITE_CREATE_INDEX, sqlite3.SQLITE_CREATE_TEMP_INDEX,
+    sqlite3.SQLITE_CREATE_VIEW, sqlite3.SQLITE_CREATE_TEMP_VIEW,
+    sqlite3.SQLITE_CREATE_TRIGGER, sqlite3.SQLITE_CREATE_TEMP_TRIGGER,
+    sqlite3.SQLITE_DROP_TABLE, sqlite3.SQLITE_DROP_TEMP_TABLE,
+    sqlite3.SQLITE_DROP_INDEX, sqlite3.SQLITE_DROP_TEMP_INDEX,
+    sqlite3.SQLITE_DROP_VIEW, sqlite3.SQLITE_DROP_TEMP_VIEW,
+    sqlite3.SQLITE_DROP_TRIGGER, sqlite3.SQLITE_DROP_TEMP_TRIGGER,
+    sqlite3.SQLITE_ALTER_TABLE,
+})
+
+# Only the server attaches databases (base databases, see _attach). From a
+# player an ATTACH (or VACUUM INTO, which the authorizer sees as an ATTACH)
+# could open or create any file the server can reach, e.g. the application
+# database with every mission's correct_query.
+_SERVER_ONLY_ACTIONS = frozenset({sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH})
+
+# The only PRAGMAs a player may run: they describe the schema and change
+# nothing.
+_PLAYER_PRAGMAS = frozenset({
+    'table_info', 'table_xinfo', 'table_list', 'index_list', 'index_info', 'index_xinfo',
+    'foreign_key_list',
+})
+
+
+# Tables the server keeps in a sandbox's temp schema (expected results and
+# materialized player results for in-engine comparison). They are not
+# mission data, and player statements may not touch them.
+INTERNAL_PREFIX = '_secuelas_'
+EXPECTED_PREFIX = INTERNAL_PREFIX + 'expected_'
+PLAYER_TABLE = INTERNAL_PREFIX + 'player'
+
+
+class QueryBudgetExceeded(Exception):
+    """Raised when a statement runs past its QueryBudget."""
+
+    def __init__(self, budget, elapsed_ms, instructions):
+        super().__init__(
+            f"La consulta excedio el presupuesto de ejecucion "
+            f"({budget.max_ms} ms / {budget.max_instructions:,} instrucciones). "
+            f"Revise JOINs sin condicion o CTEs recursivas sin limite.")
+        self.budget = budget
+        self.elapsed_ms = elapsed_ms
+        self.instructions = instructions
+
+
+class QueryBudget(namedtuple('QueryBudget', 'max_ms max_instructions')):
+    """Per-statement limits; a value of 0 disables that limit."""
+
+    # The progress handler fires every this many VM instructions.
+    GRANULARITY = 1000
+
+    @classmethod
+    def for_mission(cls, default, eval_options):
+        """Override the default budget with a mission's evaluation_options."""
+        return cls(int(eval_options.get('max_query_ms', default.max_ms)),
+                   int(eval_options.get('max_query_instructions', default.max_instructions)))
+
+
+def _connect(path):
+    # isolation_level=None: autocommit, transactions are managed explicitly.
+    # cached_statements=0: the authorizer only runs when a statement is
+    # compiled, so a cached (re-used) DELETE would otherwise go unnoticed.
+    # uri=True: base databases are attached with ?mode=ro&immutable=1.
+    conn = sqlite3.connect(path, check_same_thread=False, uri=True,
+                           isolation_level=None, cached_statements=0)
+    result_digest.register(conn)
+    return conn
+
+
+def _attach(conn, attachments, current=None, mmap_size=0):
+    """Make conn's attached databases match attachments [(schema, uri), ...]."""
+    current = dict(current or {})
+    wanted = dict(attachments)
+    for schema in [s for s in current if current[s] != wanted.get(s)]:
+        conn.execute(f'DETACH DATABASE "{schema}"')
+        del current[schema]
+    for schema, uri in wanted.items():
+        if schema not in current:
+            conn.execute("ATTACH DATABASE ? AS " + f'"{schema}"', (uri,))
+            if mmap_size:
+                conn.execute(f'PRAGMA "{schema}".mmap_size = {int(mmap_size)}')
+            current[schema] = uri
+    return current
+
+
+class Sandbox:
+    """A single player's private SQLite database."""
+
+    def __init__(self, sandbox_id, directory=None, mmap_size=0):
+        self.id = sandbox_id
+        self.path = os.path.join(directory, f"{sandbox_id}.db") if directory else ':memory:'
+        self.mmap_size = mmap_size
+        self.lock = threading.RLock()
+        self.mission_id = None
+        self.fingerprint = None
+        self.dirty = False
+        self.attached = {}
+        self._base_writes = set()
+        self._internal = None  # None (player), 'attach', 'materialize' or 'compare'
+        self.last_used = time.monotonic()
+        self.conn = None
+        self._open()
+
+    def __enter__(self):
+        self.lock.acquire()
+        self.last_used = time.monotonic()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+    def _open(self):
+        self.conn = _connect(self.path)
+        self.conn.set_authorizer(self._authorize)
+
+    def _authorize(self, action, arg1, arg2, db_name, trigger):
+        if self._internal is None and (action in _SERVER_ONLY_ACTIONS or (
+                action == sqlite3.SQLITE_PRAGMA and arg1 not in _PLAYER_PRAGMAS)):
+            return sqlite3.SQLITE_DENY
+        if arg1 and (arg1.startswith(INTERNAL_PREFIX) or (self._internal and arg1 == 'sqlite_temp_master')):
+            # Server-side temp tables don't make the sandbox dirty. Players can't
+            # touch them, and only comparisons may read expected results.
+            if self._internal is None or (action == sqlite3.SQLITE_READ and self._internal != 'compare'
+                                          and arg1.startswith(EXPECTED_PREFIX)):
+                return sqlite3.SQLITE_DENY
+            return sqlite3.SQLITE_OK
+        if action in _WRITE_ACTIONS:
+            self.dirty = True
+            if db_name in self.attached and arg1:
+                self._base_writes.add((db_name, arg1))
+        return sqlite3.SQLITE_OK
+
+    def needs_reload(self, setup_fingerprint):
+        """True unless the sandbox holds untouched data with this fingerprint."""
+        return self.dirty or self.fingerprint != setup_fingerprint
+
+    def wipe(self):
+        """Throw away every table (including ones the player created)."""
+        self.conn.close()
+        if self.path != ':memory:' and os.path.exists(self.path):
+            os.remove(self.path)
+        self._open()
+        self.mission_id = None
+        self.fingerprint = None
+        self.attached = {}
+
+    def load_mission(self, mission_id, statements):
+        """Wipe the sandbox and run the mission's setup statements in one transaction."""
+        self.wipe()
+        self.conn.execute("BEGIN")
+        try:
+            for stmt in statements:
+                if stmt and stmt.strip():
+                    self.conn.execute(stmt)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.mission_id = mission_id
+        self.fingerprint = fingerprint(statements)
+        self.dirty = False
+
+    def restore(self, mission_id, template):
+        """Replace the sandbox contents with a MissionTemplate."""
+        if self.dirty:
+            # Creating temp objects flags the sandbox dirty, so a clean one has
+            # none. Internal tables are kept: players can't touch them, they are
+            # keyed by content, and player statements may not drop them.
+            for kind, name in self.conn.execute(
+                    "SELECT type, name FROM sqlite_temp_master WHERE type IN ('table', 'view') "
+                    "AND substr(name, 1, ?) != ?", (len(INTERNAL_PREFIX), INTERNAL_PREFIX)).fetchall():
+                self.conn.execute(f'DROP {kind.upper()} IF EXISTS temp."{name}"')
+        # deserialize() goes through an internal ATTACH, which players may not run.
+        with self.internal('attach'):
+            if self.path == ':memory:' and hasattr(self.conn, 'deserialize'):
+                self.conn.deserialize(template.image)
+            else:
+                # File-backed sandboxes (or Python < 3.11): copy the pages with the backup API.
+                source = sqlite3.connect(':memory:')
+                try:
+                    _deserialize_into(source, template.image)
+                    source.backup(self.conn)
+                finally:
+                    source.close()
+            self.attached = _attach(self.conn, template.attachments, self.attached, self.mmap_size)
+        self.mission_id = mission_id
+        self.fingerprint = template.fingerprint
+        self.dirty = False
+
+    def migrate(self, mission_id, template, delta):
+        """Apply a setup delta to a clean sandbox so it matches template."""
+        with self.internal('attach'):
+            self.attached = _attach(self.conn, template.attachments, self.attached, self.mmap_size)
+        if delta:
+            self.conn.execute("BEGIN")
+            try:
+                for stmt in delta:
+                    self.conn.execute(stmt)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self.mission_id = mission_id
+        self.fingerprint = template.fingerprint
+        self.dirty = False
+
+    def adopt(self, mission_id, conn, template):
+        """Swap in a pooled connection that already holds the mission's data."""
+        self.conn.close()
+        self.conn = conn
+        self.conn.set_authorizer(self._authorize)
+        self.attached = dict(template.attachments)
+        self.mission_id = mission_id
+        self.fingerprint = template.fingerprint
+        self.dirty = False
+
+    @contextmanager
+    def attempt(self):
+        """
+        Run the player's statements inside a savepoint that is always rolled
+        back, leaving the mission data exactly as it was loaded.
+        """
+        was_dirty = self.dirty
+        self.conn.execute("SAVEPOINT player_attempt")
+        try:
+            yield self
+        finally:
+            if self.conn.in_transaction:
+                self.conn.execute("ROLLBACK TO player_attempt")
+                self.conn.execute("RELEASE player_attempt")
+                # ATTACH/DETACH are not undone by a rollback (and players may
+                # not run them): only trust the clean flag if the attachments
+                # are still the template's.
+                self.dirty = was_dirty or not self._attachments_intact()
+            # Otherwise the player's own COMMIT/ROLLBACK/RELEASE closed our
+            # savepoint: any write they made is permanent and stays flagged.
+
+    def _attachments_intact(self):
+        """False, and self.attached resynced, if the attached databases changed."""
+        with self.internal('attach'):
+            actual = {name: path for _, name, path in self.conn.execute('PRAGMA database_list')
+                      if name not in ('main', 'temp')}
+        if actual.keys() == self.attached.keys():
+            return True
+        # Paths never equal the URIs _attach recorded, so the next restore re-attaches them all.
+        self.attached = actual
+        return False
+
+    @contextmanager
+    def budget(self, budget):
+        """
+        Enforce a QueryBudget on everything executed or fetched inside the
+        block; SQLite aborts the statement and QueryBudgetExceeded is raised.
+        """
+        if budget is None or not (budget.max_ms or budget.max_instructions):
+            yield self
+            return
+        start = time.monotonic()
+        deadline = start + budget.max_ms / 1000.0 if budget.max_ms else None
+        state = {'instructions': 0, 'exceeded': False}
+
+        def progress():
+            state['instructions'] += QueryBudget.GRANULARITY
+            if ((budget.max_instructions and state['instructions'] > budget.max_instructions)
+                    or (deadline and time.monotonic() > deadline)):
+                state['exceeded'] = True
+                return 1  # non-zero aborts the running statement
+            return 0
+
+        self.conn.set_progress_handler(progress, QueryBudget.GRANULARITY)
+        try:
+            yield self
+        except sqlite3.OperationalError as e:
+            if state['exceeded']:
+                elapsed_ms = (time.monotonic() - start) * 1000
+                raise QueryBudgetExceeded(budget, elapsed_ms, state['instructions']) from e
+            raise
+        finally:
+            self.conn.set_progress_handler(None, QueryBudget.GRANULARITY)
+
+    def execute(self, sql):
+        """
+        Run one statement. Writes aimed at a read-only base table are retried
+        after copying that table into the sandbox, which shadows the base.
+        """
+        self._base_writes = set()
+        try:
+            return self.conn.execute(sql)
+        except sqlite3.OperationalError as e:
+            if not self._base_writes or 'readonly' not in str(e):
+                raise
+        for schema, table in sorted(self._base_writes):
+            self._copy_up(schema, table)
+        return self.conn.execute(sql)
+
+    def _copy_up(self, schema, table):
+        row = self.conn.execute(
+            f'SELECT sql FROM "{schema}".sqlite_master WHERE type = \'table\' AND name = ?',
+            (table,)).fetchone()
+        exists = self.conn.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+        if row is None or exists:
+            return
+        # The stored CREATE statement is unqualified, so it lands in main.
+        self.conn.execute(row[0])
+        self.conn.execute(f'INSERT INTO main."{table}" SELECT * FROM "{schema}"."{table}"')
+
+    @contextmanager
+    def internal(self, mode):
+        """Run server statements that may use internal temp tables (see _authorize)."""
+        previous, self._internal = self._internal, mode
+        try:
+            yield self
+        finally:
+            self._internal = previous
+
+    def result_columns(self, select_sql):
+        """Column labels of a SELECT without running it, duplicates included."""
+        with self.internal('materialize'):
+            cursor = self.conn.execute(f'SELECT * FROM ({select_sql}) LIMIT 0')
+        labels = [d[0] for d in cursor.description]
+        cursor.close()
+        # A subquery's duplicate labels come back renamed "id:1", "id:2"...
+        seen = set()
+        for i, label in enumerate(labels):
+            base, sep, suffix = label.rpartition(':')
+            if sep and suffix.isdigit() and base in seen:
+                labels[i] = base
+            seen.add(labels[i])
+        return tuple(labels)
+
+    def materialize(self, table, select_sql):
+        """(Re)create an internal temp table holding the rows of a SELECT."""
+        with self.internal('materialize'):
+            self.conn.execute(f'DROP TABLE IF EXISTS temp."{table}"')
+            self.conn.execute(f'CREATE TEMP TABLE "{table}" AS SELECT * FROM ({select_sql})')
+
+    def drop_internal(self, table):
+        with self.internal('materialize'):
+            self.conn.execute(f'DROP TABLE IF EXISTS temp."{table}"')
+
+    def expected_table(self, query):
+        """
+        Name of the internal temp table holding query's result on this
+        sandbox's pristine data. It is built on first use and kept while the
+        sandbox holds the same dataset; other datasets' tables are dropped.
+        """
+        table = f"{EXPECTED_PREFIX}{self.fingerprint[:16]}_{query_fingerprint(query)[:16]}"
+        with self.internal('materialize'):
+            existing = [r[0] for r in self.conn.execute(
+                "SELECT name FROM sqlite_temp_master WHERE type = 'table' AND substr(name, 1, ?) = ?",
+                (len(EXPECTED_PREFIX), EXPECTED_PREFIX))]
+            for name in existing:
+                if name != table:
+                    self.conn.execute(f'DROP TABLE temp."{name}"')
+        if table not in existing:
+            self.materialize(table, strip_trailing(query))
+        return table
+
+    def result_digest(self, select_sql, column_count, indices=None, ordered=True):
+        """
+        Digest of a SELECT's result (see result_digest.digest_sql), computed
+        in one pass without fetching any row. It runs with the player's
+        permissions: select_sql is usually theirs.
+        """
+        return self.conn.execute(
+            result_digest.digest_sql(select_sql, column_count, indices, ordered)).fetchone()[0]
+
+    def internal_cursor(self, sql, params=()):
+        """Run one of the server's own queries over internal tables."""
+        with self.internal('compare'):
+            return self.conn.execute(sql, params)
+
+    def query_internal(self, sql, params=()):
+        return self.internal_cursor(sql, params).fetchall()
+
+    def close(self):
+        self.conn.close()
+        if self.path != ':memory:' and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _deserialize_into(conn, image):
+    if hasattr(conn, 'deserialize'):
+        conn.deserialize(image)
+        return
+    # Python < 3.11 has no deserialize(): go through a temporary file instead.
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix='.db')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        source = sqlite3.connect(path)
+        try:
+            source.backup(conn)
+        finally:
+            source.close()
+    finally:
+        os.remove(path)
+
+
+# local_statements: the part of the setup materialized in the image itself.
+MissionTemplate = namedtuple('MissionTemplate', 'image attachments fingerprint local_statements')
+
+# Above this many statements a delta is slower than a restore. Deserializing
+# an image takes ~10-20 us, while even one DROP TABLE in the delta makes the
+# migration several times slower (more with base databases attached, whose
+# schemas are reloaded), so only deltas without statements are used: the
+# local data is already right and just the attachments change
+# (benchmarks/bench_campaign.py).
+MAX_DELTA_STATEMENTS = 0
+
+
+def _serialize(conn):
+    if hasattr(conn, 'serialize'):
+        return conn.serialize()
+    import tempfile
+    fd, path = tempfile.mkstemp(suffix='.db')
+    os.close(fd)
+    try:
+        target = sqlite3.connect(path)
+        try:
+            conn.backup(target)
+        finally:
+            target.close()
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
+
+
+class MissionTemplates:
+    """
+    Serialized database images, one per distinct setup fingerprint. An image
+    is built the first time it is needed (or up front with build_all), so the
+    work scales with unique datasets rather than with missions, and a
+    mission's fingerprint is recomputed only when its setup script changes.
+    build_all also publishes the table
+    blocks shared between missions to the base store, and each template then
+    only contains its mission-specific tables plus the bases to attach.
+    """
+
+    def __init__(self):
+        self.base = BaseStore()
+        self._fingerprints = {}  # (mission_id, setup_script) -> fingerprint
+        self._images = {}        # fingerprint -> MissionTemplate
+        self._deltas = {}        # (from_fingerprint, to_fingerprint) -> [stmt, ...] | None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def build(statements):
+        """Run setup statements in a scratch database and return its image."""
+        conn = sqlite3.connect(':memory:', isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            for stmt in statements:
+                if stmt and stmt.strip():
+                    conn.execute(stmt)
+            conn.execute("COMMIT")
+            if conn.execute("PRAGMA page_count").fetchone()[0] == 0:
+                # Everything lives in base databases; an empty file can't be
+                # serialized, so write the header page.
+                conn.execute("PRAGMA user_version = 1")
+            return _serialize(conn)
+        finally:
+            conn.close()
+
+    def template(self, mission):
+        """Return the MissionTemplate for a MissionDefinitionDB, building it if needed."""
+        return self.template_for(mission.id, mission.setup_sql_script, mission.setup_sql)
+
+    def fingerprint(self, mission):
+        return self.fingerprint_for(mission.id, mission.setup_sql_script, mission.setup_sql)
+
+    def fingerprint_for(self, mission_id, setup_script, statements):
+        key = (mission_id, setup_script)
+        setup_fingerprint = self._fingerprints.get(key)
+        if setup_fingerprint is None:
+            setup_fingerprint = fingerprint(statements)
+            with self._lock:
+                # Forget older versions of this mission's setup (and their
+                # images, unless another mission still uses them).
+                for old_key in [k for k in self._fingerprints if k[0] == mission_id]:
+                    old_fingerprint = self._fingerprints.pop(old_key)
+                    if old_fingerprint not in self._fingerprints.values():
+                        self._images.pop(old_fingerprint, None)
+                        for delta_key in [k for k in self._deltas if old_fingerprint in k]:
+                            del self._deltas[delta_key]
+                self._fingerprints[key] = setup_fingerprint
+        return setup_fingerprint
+
+    def template_for(self, mission_id, setup_script, statements):
+        setup_fingerprint = self.fingerprint_for(mission_id, setup_script, statements)
+        template = self._images.get(setup_fingerprint)
+        if template is None:
+            local, attachments = self.base.split(statements)
+            try:
+                template = MissionTemplate(self.build(local), attachments, setup_fingerprint, tuple(local))
+            except sqlite3.Error:
+                # Local statements depend on a base table: keep everything local.
+                template = MissionTemplate(self.build(statements), (), setup_fingerprint, tuple(statements))
+            with self._lock:
+                self._images[setup_fingerprint] = template
+        return template
+
+    def __contains__(self, setup_fingerprint):
+        return setup_fingerprint in self._images
+
+    def delta(self, from_fingerprint, to_template):
+        """
+        Cached statements migrating the from_fingerprint dataset to
+        to_template, or None when a full restore should be used instead.
+        """
+        key = (from_fingerprint, to_template.fingerprint)
+        if key in self._deltas:
+            return self._deltas[key]
+        source = self._images.get(from_fingerprint)
+        delta = None
+        if source is not None:
+            delta = setup_delta(source.local_statements, to_template.local_statements)
+            if delta is not None and len(delta) > MAX_DELTA_STATEMENTS:
+                delta = None
+        with self._lock:
+            self._deltas[key] = delta
+        return delta
+
+    def build_all(self, missions):
+        if self.base.enabled:
+            self.base.publish(find_shared_blocks([m.setup_sql for m in missions]))
+            with self._lock:
+                self._images.clear()
+                self._deltas.clear()
+        previous = None
+        for mission in missions:
+            template = self.template(mission)
+            # Precompute the migration from each mission to the next one.
+            if previous is not None and previous.fingerprint != template.fingerprint:
+                self.delta(previous.fingerprint, template)
+            previous = template
+
+    def stats(self):
+        with self._lock:
+            return {'templates': len(self._images),
+                    'template_missions': len(self._fingerprints),
+                    'template_bytes': sum(len(t.image) for t in self._images.values()),
+                    'template_deltas': sum(1 for d in self._deltas.values() if d is not None),
+                    'base_blocks': len(self.base.blocks)}
+
+
+# columns: labels of the correct_query's result; digest / multiset_digest: its
+# order-sensitive and order-insensitive digests; rows: the row tuples, or None
+# when the result is larger than ExpectedResults.max_rows.
+ExpectedResult = namedtuple('ExpectedResult', 'columns row_count digest multiset_digest rows')
+
+
+class ExpectedResults:
+    """
+    Result of every mission's correct_query, keyed by (setup fingerprint,
+    query fingerprint) and computed once on a scratch copy of the mission's
+    template. Each mission remembers its current key, so an edited setup or
+    query replaces the old entry, and invalidate() drops it when the
+    MissionDefinitionDB row changes.
+
+    Results with more than max_rows rows are kept as digests only: a player's
+    result is matched against the digest, and the rows are recomputed
+    (row_loader) only to explain a mismatch.
+    """
+
+    def __init__(self, templates, max_rows=5000):
+        self.templates = templates
+        self.max_rows = max_rows
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self._results = {}   # (setup fingerprint, exact query fingerprint) -> ExpectedResult
+        self._missions = {}  # mission_id -> key
+        self._lock = threading.Lock()
+
+    def get(self, mission):
+        """Return the ExpectedResult for a MissionDefinitionDB."""
+        template = self.templates.template(mission)
+        # Not the canonical fingerprint: the result keeps the query's column labels.
+        key = (template.fingerprint, exact_fingerprint(mission.correct_query_script))
+        result = self._results.get(key)
+        if result is None:
+            result = self.compute(template, mission.correct_query_script, self.max_rows)
+        with self._lock:
+            if key in self._results:
+                self.hits += 1
+            else:
+                self.misses += 1
+                self._results[key] = result
+            previous = self._missions.get(mission.id)
+            self._missions[mission.id] = key
+            if previous is not None and previous != key:
+                self._forget_locked(previous)
+        return result
+
+    def row_loader(self, mission):
+        """
+        Function returning the mission's expected rows, recomputed on every
+        call. Used for results kept as digests only.
+        """
+        template = self.templates.template(mission)
+        query = mission.correct_query_script
+
+        def load():
+            with self._lock:
+                self.reloads += 1
+            return self.compute_rows(template, query)
+        return load
+
+    @staticmethod
+    @contextmanager
+    def _scratch(template):
+        """A fresh in-memory copy of the template's data."""
+        conn = _connect(':memory:')
+        try:
+            _deserialize_into(conn, template.image)
+            _attach(conn, template.attachments)
+            yield conn
+        finally:
+            conn.close()
+
+    @classmethod
+    def compute(cls, template, query, max_rows):
+        """Run query against a fresh copy of the template's data."""
+        with cls._scratch(template) as conn:
+            cursor = conn.execute(query)
+            columns = tuple(d[0] for d in cursor.description) if cursor.description else ()
+            cursor.close()
+            if not columns:
+                return ExpectedResult(columns, 0, result_digest.EMPTY[result_digest.ORDERED],
+                                      result_digest.EMPTY[result_digest.UNORDERED], [])
+            select_sql = strip_trailing(query)
+            digest = conn.execute(result_digest.digest_sql(select_sql, len(columns))).fetchone()[0]
+            multiset_digest = conn.execute(
+                result_digest.digest_sql(select_sql, len(columns), ordered=False)).fetchone()[0]
+            row_count = result_digest.row_count(digest)
+            rows = conn.execute(query).fetchall() if row_count <= max_rows else None
+        return ExpectedResult(columns, row_count, digest, multiset_digest, rows)
+
+    @classmethod
+    def compute_rows(cls, template, query):
+        with cls._scratch(template) as conn:
+            return conn.execute(query).fetchall()
+
+    def build_all(self, missions):
+        for mission in missions:
+            self.get(mission)
+
+    def invalidate(self, mission_id):
+        """Forget a mission's expected result; it is recomputed on next use."""
+        with self._lock:
+            key = self._missions.pop(mission_id, None)
+            if key is not None:
+                self._forget_locked(key)
+
+    def _forget_locked(self, key):
+        # Missions with the same setup and query share the entry.
+        if key not in self._missions.values():
+            self._results.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            results = list(self._results.values())
+            return {'expected_results': len(results),
+                    'expected_rows': sum(len(r.rows) for r in results if r.rows is not None),
+                    'expected_digest_only': sum(r.rows is None for r in results),
+                    'expected_hits': self.hits, 'expected_misses': self.misses,
+                    'expected_reloads': self.reloads}
+
+
+class SandboxPool:
+    """
+    Ready-to-use in-memory connections keyed by setup fingerprint. Each entry is
+    charged the size of its mission image (shared base databases are not
+    counted) against SANDBOX_POOL_MAX_BYTES and
+    the least recently used missions are evicted first. Connections are
+    handed out once (acquire) and refilled by prefetch() on a background
+    thread.
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, per_mission=2):
+        self.max_bytes = max_bytes
+        self.per_mission = per_mission
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.prefetches = 0
+        self.mmap_size = 0
+        self._entries = OrderedDict()  # fingerprint -> [(conn, template), ...]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sandbox-prefetch')
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0 and self.per_mission > 0
+
+    def acquire(self, setup_fingerprint):
+        """Take a hydrated (conn, template) for this dataset, or None on a miss."""
+        with self._lock:
+            ready = self._entries.get(setup_fingerprint)
+            if not ready:
+                self.misses += 1
+                return None
+            entry = ready.pop()
+            if not ready:
+                del self._entries[setup_fingerprint]
+            else:
+                self._entries.move_to_end(setup_fingerprint)
+            self._bytes -= len(entry[1].image)
+            self.hits += 1
+            return entry
+
+    def prefetch(self, setup_fingerprint, template_source):
+        """
+        Hydrate one connection for this dataset in the background.
+        template_source is a zero-argument callable returning its MissionTemplate.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            if len(self._entries.get(setup_fingerprint, ())) >= self.per_mission:
+                return
+        self._executor.submit(self._fill, setup_fingerprint, template_source)
+
+    def _fill(self, setup_fingerprint, template_source):
+        try:
+            template = template_source()
+            conn = _connect(':memory:')
+            _deserialize_into(conn, template.image)
+            _attach(conn, template.attachments, mmap_size=self.mmap_size)
+        except Exception as e:
+            print(f"SandboxPool: prefetch de {setup_fingerprint[:12]} fallido: {e}")
+            return
+        size = len(template.image)
+        with self._lock:
+            ready = self._entries.setdefault(setup_fingerprint, [])
+            if len(ready) >= self.per_mission or size > self.max_bytes:
+                if not ready:
+                    del self._entries[setup_fingerprint]
+                conn.close()
+                return
+            ready.append((conn, template))
+            self._entries.move_to_end(setup_fingerprint)
+            self._bytes += size
+            self.prefetches += 1
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and self._entries:
+            setup_fingerprint, ready = next(iter(self._entries.items()))
+            conn, template = ready.pop(0)
+            if not ready:
+                del self._entries[setup_fingerprint]
+            conn.close()
+            self._bytes -= len(template.image)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'pool_hits': self.hits, 'pool_misses': self.misses,
+                    'pool_hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                    'pool_evictions': self.evictions, 'pool_prefetches': self.prefetches,
+                    'pool_bytes': self._bytes, 'pool_max_bytes': self.max_bytes,
+                    'pool_datasets': len(self._entries)}
+
+
+class SandboxManager:
+    """
+    Keeps one Sandbox per player session, keyed by an opaque id stored in the
+    Flask session. Idle sandboxes expire after SANDBOX_IDLE_TTL seconds and the
+    least recently used ones are evicted beyond SANDBOX_MAX_SESSIONS.
+    SANDBOX_RESET_MODE picks how a sandbox is cleaned between attempts:
+    'savepoint' (roll back each attempt) or 'restore' (reload the template).
+    Missions are loaded from the warm pool when possible, otherwise from
+    their template image.
+    A sandbox that is missing (evicted, or created by another worker process)
+    is simply rebuilt from the mission setup on the next request.
+    """
+
+    def __init__(self, app=None):
+        self.max_sandboxes = 500
+        self.idle_ttl = 30 * 60
+        self.directory = None
+        self.reset_mode = 'savepoint'
+        self.query_budget = QueryBudget(max_ms=2000, max_instructions=20_000_000)
+        self.templates = MissionTemplates()
+        self.expected = ExpectedResults(self.templates)
+        self.pool = SandboxPool()
+        self._sandboxes = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_sandboxes = app.config.get('SANDBOX_MAX_SESSIONS', self.max_sandboxes)
+        self.idle_ttl = app.config.get('SANDBOX_IDLE_TTL', self.idle_ttl)
+        self.directory = app.config.get('SANDBOX_DIR') or None
+        self.reset_mode = app.config.get('SANDBOX_RESET_MODE', self.reset_mode)
+        self.query_budget = QueryBudget(
+            app.config.get('QUERY_MAX_MS', self.query_budget.max_ms),
+            app.config.get('QUERY_MAX_INSTRUCTIONS', self.query_budget.max_instructions))
+        if self.reset_mode not in RESET_MODES:
+            raise ValueError(f"SANDBOX_RESET_MODE must be one of {RESET_MODES}, got {self.reset_mode!r}")
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self.expected.max_rows = app.config.get('EXPECTED_MAX_ROWS', self.expected.max_rows)
+        self.pool.max_bytes = app.config.get('SANDBOX_POOL_MAX_BYTES', self.pool.max_bytes)
+        self.pool.per_mission = app.config.get('SANDBOX_POOL_PER_MISSION', self.pool.per_mission)
+        self.templates.base.directory = app.config.get('SANDBOX_BASE_DIR') or None
+        self.templates.base.mmap_size = app.config.get('SANDBOX_BASE_MMAP_SIZE', self.templates.base.mmap_size)
+        self.pool.mmap_size = self.templates.base.mmap_size
+        if self.directory:
+            # Pooled connections are in-memory; file-backed sandboxes can't adopt them.
+            self.pool.max_bytes = 0
+
+    @staticmethod
+    def new_id():
+        return secrets.token_hex(16)
+
+    def get(self, sandbox_id):
+        """Return the sandbox for this id, creating an empty one if needed."""
+        with self._lock:
+            sandbox = self._sandboxes.get(sandbox_id)
+            if sandbox is None:
+                self._evict_locked()
+                sandbox = Sandbox(sandbox_id, self.directory, self.templates.base.mmap_size)
+                self._sandboxes[sandbox_id] = sandbox
+            sandbox.last_used = time.monotonic()
+            return sandbox
+
+    def load(self, sandbox, mission):
+        """Put a MissionDefinitionDB's pristine data into the sandbox."""
+        template = self.templates.template(mission)
+        delta = self._clean_delta(sandbox, template)
+        if delta is not None:
+            sandbox.migrate(mission.id, template, delta)
+            return
+        entry = self.pool.acquire(template.fingerprint) if self.pool.enabled else None
+        if entry is not None:
+            sandbox.adopt(mission.id, *entry)
+            return
+        # Dirty sandbox or no usable delta: full restore from the template.
+        sandbox.restore(mission.id, template)
+
+    def _clean_delta(self, sandbox, template):
+        if sandbox.dirty or sandbox.fingerprint is None:
+            return None
+        return self.templates.delta(sandbox.fingerprint, template)
+
+    def prefetch(self, mission, sandbox=None):
+        """
+        Warm the pool for a mission the player is likely to need next, unless
+        the player's sandbox can reach it with a cheap delta.
+        """
+        mission_id, script, statements = mission.id, mission.setup_sql_script, mission.setup_sql
+        setup_fingerprint = self.templates.fingerprint_for(mission_id, script, statements)
+        if sandbox is not None and setup_fingerprint in self.templates:
+            if self._clean_delta(sandbox, self.templates.template(mission)) is not None:
+                return
+        self.pool.prefetch(setup_fingerprint,
+                           lambda: self.templates.template_for(mission_id, script, statements))
+
+    def discard(self, sandbox_id):
+        with self._lock:
+            sandbox = self._sandboxes.pop(sandbox_id, None)
+        if sandbox is not None:
+            with sandbox:
+                sandbox.close()
+
+    def _evict_locked(self):
+        now = time.monotonic()
+        expired = [s for s in self._sandboxes.values() if now - s.last_used > self.idle_ttl]
+        if len(self._sandboxes) - len(expired) >= self.max_sandboxes:
+            by_age = sorted(self._sandboxes.values(), key=lambda s: s.last_used)
+            expired = by_age[:len(self._sandboxes) - self.max_sandboxes + 1]
+        for sandbox in expired:
+            del self._sandboxes[sandbox.id]
+            # A request may still hold the sandbox; only close it if it's free.
+            if sandbox.lock.acquire(blocking=False):
+                try:
+                    sandbox.close()
+                finally:
+                    sandbox.lock.release()
+
+    def stats(self):
+        with self._lock:
+            stats = {'active_sandboxes': len(self._sandboxes),
+                     'max_sandboxes': self.max_sandboxes,
+                     'storage': self.directory or 'memory',
+                     'reset_mode': self.reset_mode}
+        stats.update(self.templates.stats())
+        stats.update(self.expected.stats())
+        stats.update(self.pool.stats())
+        return stats
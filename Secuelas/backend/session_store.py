@@ -0,0 +1,323 @@
+# Secuelas/backend/session_store.py
+"""
+Server-side Flask sessions.
+
+Flask's default session lives in a signed cookie: every request carries the
+whole session, every change re-serializes and re-signs it, and a session
+over ~4KB (a page of query results is enough) is silently dropped by the
+browser. SessionStore keeps the data on the server instead; the cookie only
+holds an opaque random id.
+
+Sessions are serialized with the same tagged JSON as Flask's signed
+cookies and stored in a SQLite database (SessionDB) behind an in-process
+LRU of their serialized form, charged by size (SESSION_CACHE_MAX_BYTES).
+Never pickle: whoever can write to the file could then run code in the
+server, while a JSON payload can at most be a different session.
+Every write gets a new random version, so a cached session is only trusted
+while the database still holds that version: a primary-key lookup instead
+of reading and decoding the whole row, and safe with several worker
+processes sharing the file.
+
+Writes go to the database when the response is saved. With
+SESSION_WRITE_BEHIND > 0 they are instead queued and flushed by a
+background thread in one transaction every that many seconds (or as soon
+as SessionStore.write_batch sessions are waiting); a session is
+then only up to date in the process that served it, so write-behind needs a
+single worker process (or sticky sessions).
+
+Sessions expire SESSION_TTL seconds after their last write; expired rows
+are purged periodically. SESSION_STORE='cookie' keeps Flask's signed
+cookies. A valid signed-cookie session presented to the server-side store
+is adopted once, so switching stores does not reset players' progress.
+"""
+import atexit
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask.sessions import (SecureCookieSession, SecureCookieSessionInterface, SessionInterface,
+                            session_json_serializer)
+
+STORES = ('server', 'cookie')
+
+# payload: the session dict as tagged JSON; version:
+# random token changed on every write; expires: time.time() deadline.
+StoredSession = namedtuple('StoredSession', 'payload version expires')
+
+
+def _decode(payload):
+    """Session dict from a stored payload, or None if it is not one (e.g. a pickled row)."""
+    try:
+        data = session_json_serializer.loads(payload)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+class ServerSession(SecureCookieSession):
+    """Session dict tracked like Flask's, plus the id and version it was loaded with."""
+
+    def __init__(self, initial=None, sid=None, version=None, new=False):
+        super().__init__(initial)
+        self.sid = sid
+        self.version = version
+        self.new = new
+
+
+class SessionDB:
+    """sessions(sid, version, expires, payload) in a SQLite file, shared by all workers."""
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS sessions ('
+                           'sid TEXT PRIMARY KEY, version TEXT NOT NULL, expires REAL NOT NULL, payload BLOB NOT NULL)')
+        self._lock = threading.Lock()
+
+    def version(self, sid, now):
+        with self._lock:
+            row = self._conn.execute('SELECT version FROM sessions WHERE sid = ? AND expires > ?',
+                                     (sid, now)).fetchone()
+        return row[0] if row else None
+
+    def load(self, sid, now):
+        with self._lock:
+            row = self._conn.execute('SELECT payload, version, expires FROM sessions WHERE sid = ? AND expires > ?',
+                                     (sid, now)).fetchone()
+        return StoredSession(*row) if row else None
+
+    def write(self, changes):
+        """Apply {sid: StoredSession or None (delete)} in one transaction."""
+        upserts = [(sid, s.version, s.expires, s.payload) for sid, s in changes.items() if s is not None]
+        deletes = [(sid,) for sid, s in changes.items() if s is None]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany(
+                    'INSERT INTO sessions (sid, version, expires, payload) VALUES (?, ?, ?, ?) '
+                    'ON CONFLICT(sid) DO UPDATE SET version = excluded.version, '
+                    'expires = excluded.expires, payload = excluded.payload', upserts)
+                self._conn.executemany('DELETE FROM sessions WHERE sid = ?', deletes)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def purge(self, now):
+        with self._lock:
+            return self._conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,)).rowcount
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute('SELECT count(*) FROM sessions').fetchone()[0]
+
+
+class SessionStore(SessionInterface):
+    """
+    Flask session interface backed by SessionDB with an LRU in front of it.
+    init_app() installs it as app.session_interface (unless SESSION_STORE is
+    'cookie').
+    """
+
+    def __init__(self, app=None):
+        self.store = 'server'
+        self.path = None
+        self.ttl = 7 * 24 * 3600
+        self.cache_max_bytes = 8 * 1024 * 1024
+        self.write_behind = 0
+        self.write_batch = 256
+        self.purge_interval = 600
+        self.db = None
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.flushes = 0
+        self.adopted = 0
+        self._cache = OrderedDict()  # sid -> StoredSession
+        self._cache_bytes = 0
+        self._pending = {}  # sid -> StoredSession or None, not yet in the database
+        self._last_purge = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        self._cookie_sessions = SecureCookieSessionInterface()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.store = app.config.get('SESSION_STORE', self.store)
+        if self.store not in STORES:
+            raise ValueError(f"SESSION_STORE must be one of {STORES}, got {self.store!r}")
+        if self.store == 'cookie':
+            return
+        self.path = app.config.get('SESSION_DB_PATH') or os.path.join(app.instance_path, 'sessions.db')
+        self.ttl = app.config.get('SESSION_TTL', self.ttl)
+        self.cache_max_bytes = app.config.get('SESSION_CACHE_MAX_BYTES', self.cache_max_bytes)
+        self.write_behind = app.config.get('SESSION_WRITE_BEHIND', self.write_behind)
+        self.db = SessionDB(self.path)
+        app.session_interface = self
+        if self.write_behind > 0 and self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='session-flush', daemon=True)
+            self._flusher.start()
+            atexit.register(self.flush)
+
+    # --- Flask interface -------------------------------------------------
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            stored = self._get(sid)
+            data = _decode(stored.payload) if stored is not None else None
+            if data is not None:
+                return ServerSession(data, sid, stored.version)
+            # A session from the signed-cookie store: keep its data under a new id.
+            legacy = self._cookie_sessions.open_session(app, request)
+            if legacy:
+                self.adopted += 1
+                session = ServerSession(legacy, secrets.token_urlsafe(32), new=True)
+                session.modified = True
+                return session
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        partitioned = self.get_cookie_partitioned(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self._put(session.sid, None)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure,
+                                       partitioned=partitioned, samesite=samesite, httponly=httponly)
+                response.vary.add('Cookie')
+            return
+
+        if session.modified:
+            stored = self._store(session)
+            session.version = stored.version
+        if session.new or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid, expires=self.get_expiration_time(app, session),
+                                httponly=httponly, domain=domain, path=path, secure=secure,
+                                partitioned=partitioned, samesite=samesite)
+            response.vary.add('Cookie')
+
+    # --- Storage ----------------------------------------------------------
+
+    def _store(self, session):
+        payload = session_json_serializer.dumps(dict(session))
+        now = time.time()
+        with self._lock:
+            current = self._cache.get(session.sid) or self._pending.get(session.sid)
+        # Unchanged data (e.g. a popped key that was not there) only needs a
+        # write when its expiry is getting close.
+        if current is not None and current.payload == payload and current.expires - now > self.ttl / 2:
+            return current
+        stored = StoredSession(payload, secrets.token_hex(8), now + self.ttl)
+        self._put(session.sid, stored)
+        return stored
+
+    def _get(self, sid):
+        now = time.time()
+        with self._lock:
+            stored = self._pending.get(sid, self._cache.get(sid))
+            pending = sid in self._pending
+        if pending:
+            self.hits += 1
+            return stored if stored is not None and stored.expires > now else None
+        if stored is not None and stored.expires > now and self.db.version(sid, now) == stored.version:
+            with self._lock:
+                if sid in self._cache:
+                    self._cache.move_to_end(sid)
+            self.hits += 1
+            return stored
+        self.misses += 1
+        stored = self.db.load(sid, now)
+        with self._lock:
+            self._cache_put_locked(sid, stored)
+        return stored
+
+    def _put(self, sid, stored):
+        with self._lock:
+            self._cache_put_locked(sid, stored)
+            self.writes += 1
+            if self.write_behind > 0:
+                self._pending[sid] = stored
+                if len(self._pending) >= self.write_batch:
+                    self._wake.set()
+                return
+        self.db.write({sid: stored})
+        self._maybe_purge()
+
+    def _cache_put_locked(self, sid, stored):
+        previous = self._cache.pop(sid, None)
+        if previous is not None:
+            self._cache_bytes -= len(previous.payload)
+        if stored is None or len(stored.payload) > self.cache_max_bytes:
+            return
+        self._cache[sid] = stored
+        self._cache_bytes += len(stored.payload)
+        while self._cache_bytes > self.cache_max_bytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted.payload)
+
+    def flush(self):
+        """Write every queued change to the database."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if pending:
+            try:
+                self.db.write(pending)
+            except sqlite3.Error as e:
+                print(f"SessionStore: escritura diferida fallida ({len(pending)} sesiones): {e}")
+                with self._lock:
+                    # Keep newer changes queued meanwhile, retry the rest next time.
+                    self._pending = {**pending, **self._pending}
+                return
+            self.flushes += 1
+        self._maybe_purge()
+
+    def _flush_loop(self):
+        while True:
+            self._wake.wait(self.write_behind)
+            self._wake.clear()
+            self.flush()
+
+    def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.purge_interval:
+            return
+        self._last_purge = now
+        try:
+            self.db.purge(now)
+        except sqlite3.Error as e:
+            print(f"SessionStore: limpieza de sesiones caducadas fallida: {e}")
+
+    def stats(self):
+        if self.db is None:
+            return {'session_store': self.store}
+        with self._lock:
+            lookups = self.hits + self.misses
+            stats = {'session_store': self.store, 'session_db': self.path,
+                     'session_cached': len(self._cache), 'session_cache_bytes': self._cache_bytes,
+                     'session_cache_max_bytes': self.cache_max_bytes,
+                     'session_hits': self.hits, 'session_misses': self.misses,
+                     'session_hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                     'session_writes': self.writes, 'session_pending': len(self._pending),
+                     'session_flushes': self.flushes, 'session_adopted': self.adopted}
+        stats['session_rows'] = self.db.count()
+        return stats
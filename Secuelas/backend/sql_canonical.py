@@ -0,0 +1,138 @@
+# Secuelas/backend/sql_canonical.py
+"""
+SQL tokenizer and canonicalizer.
+
+canonicalize() rewrites a statement so that variants SQLite treats the same
+way get the same text: comments and trailing semicolons are removed,
+whitespace is normalized, keywords are upper-cased and unquoted identifiers
+are lower-cased (SQLite folds ASCII case only, so non-ASCII letters are
+kept). String, blob and numeric literals and quoted identifiers ("x", `x`,
+[x]) are preserved exactly: an unresolved "x" falls back to a string
+literal, so the three quotings are not interchangeable.
+
+    canonicalize("select  *  from Empleados order by id asc; -- listo")
+    -> 'SELECT * FROM empleados ORDER BY id ASC'
+
+Queries with the same canonical form return the same rows, but not
+necessarily the same column labels: SQLite names an unaliased result column
+after its source text, so "count( * )" and "COUNT(*)" differ. Only
+canonicalize what is compared by content (rows, setup scripts), and run the
+original text. strip_trailing() trims what would keep a statement from being
+wrapped as a subquery and nothing else; exact_fingerprint() hashes that form,
+for results whose labels are kept.
+
+fingerprint() hashes the canonical text; it is what identifies a query in
+caches and statistics. A mission-sized query is canonicalized in a few tens of
+microseconds; fingerprints are memoized, so a repeated query costs well
+under one (benchmarks/bench_sql_canonical.py).
+"""
+import hashlib
+import re
+from functools import lru_cache
+
+# https://www.sqlite.org/lang_keywords.html
+KEYWORDS = frozenset("""
+ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH AUTOINCREMENT
+BEFORE BEGIN BETWEEN BY CASCADE CASE CAST CHECK COLLATE COLUMN COMMIT CONFLICT
+CONSTRAINT CREATE CROSS CURRENT CURRENT_DATE CURRENT_TIME CURRENT_TIMESTAMP
+DATABASE DEFAULT DEFERRABLE DEFERRED DELETE DESC DETACH DISTINCT DO DROP EACH
+ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE EXISTS EXPLAIN FAIL FILTER FIRST
+FOLLOWING FOR FOREIGN FROM FULL GENERATED GLOB GROUP GROUPS HAVING IF IGNORE
+IMMEDIATE IN INDEX INDEXED INITIALLY INNER INSERT INSTEAD INTERSECT INTO IS
+ISNULL JOIN KEY LAST LEFT LIKE LIMIT MATCH MATERIALIZED NATURAL NO NOT NOTHING
+NOTNULL NULL NULLS OF OFFSET ON OR ORDER OTHERS OUTER OVER PARTITION PLAN
+PRAGMA PRECEDING PRIMARY QUERY RAISE RANGE RECURSIVE REFERENCES REGEXP REINDEX
+RELEASE RENAME REPLACE RESTRICT RETURNING RIGHT ROLLBACK ROW ROWS SAVEPOINT
+SELECT SET TABLE TEMP TEMPORARY THEN TIES TO TRANSACTION TRIGGER UNBOUNDED
+UNION UNIQUE UPDATE USING VACUUM VALUES VIEW VIRTUAL WHEN WHERE WINDOW WITH
+WITHOUT
+""".split())
+
+# One alternative per token kind, most frequent first; leading whitespace is
+# consumed with each token. Unterminated strings, identifiers and comments
+# run to the end of the input instead of failing: SQLite reports the error.
+_TOKEN_RE = re.compile(r"""\s*(
+    [xX]'[^']*'?                              # blob literal
+  | [A-Za-z_][\w$]*                           # keyword or identifier
+  | '[^']*(?:''[^']*)*'?                      # string literal
+  | --[^\n]* | /\*.*?(?:\*/|\Z)               # comments
+  | "[^"]*(?:""[^"]*)*"? | `[^`]*(?:``[^`]*)*`? | \[[^\]]*\]?   # quoted identifiers
+  | 0[xX][0-9a-fA-F]+ | (?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?
+  | [?:@$][\w$]*                              # parameters
+  | [^\W\d][\w$]*                             # identifier starting with a non-ASCII letter
+  | \|\| | ->> | -> | << | >> | <= | >= | == | != | <>
+  | \S
+)""", re.VERBOSE | re.DOTALL)
+
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+# No space is written before the first set of tokens, nor after the second.
+_NO_SPACE_BEFORE = frozenset({',', ')', '.', ';'})
+_NO_SPACE_AFTER = frozenset({'(', '.'})
+
+
+def tokenize(sql):
+    """Return the tokens of sql as strings, without whitespace or comments."""
+    return [t for t in _TOKEN_RE.findall(sql) if not t.startswith(('--', '/*'))]
+
+
+def _canonical_word(token):
+    if len(token) > 1 and token[1] == "'":
+        return 'X' + token[1:]
+    upper = token.upper()
+    if upper in KEYWORDS:
+        return upper
+    return token.lower() if token.isascii() else token.translate(_ASCII_LOWER)
+
+
+def canonicalize(sql):
+    """Return the canonical text of a SQL statement (see module docstring)."""
+    out = []
+    previous = None
+    for token in _TOKEN_RE.findall(sql):
+        first = token[0]
+        if first.isalpha() or first == '_':
+            token = _canonical_word(token)
+        elif first == '-' or first == '/':
+            if token.startswith(('--', '/*')):
+                continue
+        if (previous is not None and token not in _NO_SPACE_BEFORE and previous not in _NO_SPACE_AFTER
+                # Calls like count(*) keep the parenthesis next to the name.
+                and not (token == '(' and previous[0].isalpha() and previous not in KEYWORDS)):
+            out.append(' ')
+        out.append(token)
+        previous = token
+    while out and out[-1] == ';':
+        out.pop()
+        if out and out[-1] == ' ':
+            out.pop()
+    return ''.join(out)
+
+
+def strip_trailing(sql):
+    """
+    sql without surrounding whitespace, trailing semicolons and trailing
+    comments, which would break SELECT * FROM (sql). The rest, result column
+    labels included, is left as written.
+    """
+    end = 0
+    for match in _TOKEN_RE.finditer(sql):
+        token = match.group(1)
+        if token != ';' and not token.startswith(('--', '/*')):
+            end = match.end()
+    return sql[:end].strip()
+
+
+@lru_cache(maxsize=1024)
+def exact_fingerprint(sql):
+    """Stable hex digest identifying a query up to strip_trailing(). Memoized."""
+    return hashlib.sha256(strip_trailing(sql).encode('utf-8')).hexdigest()
+
+
+@lru_cache(maxsize=1024)
+def fingerprint(sql):
+    """
+    Stable hex digest identifying a query up to canonicalization.
+    Memoized: players resubmit the exact same text all the time.
+    """
+    return hashlib.sha256(canonicalize(sql).encode('utf-8')).hexdigest()
@@ -0,0 +1,55 @@
+# Secuelas/backend/state_delta.py
+"""
+Versioned game state, so a response can carry only the fields that changed.
+
+Every state sent to a player is summarized in their session as a digest per
+top-level field plus an opaque state_version, which changes whenever any
+field does. A client that sends back the version it holds
+(X-State-Version header, or ?since=) gets a delta:
+
+    {"state_version": "<new>", "delta_from": "<held>", <changed fields>}
+
+and merges it over its copy. Any other client (no version, or a version the
+session no longer holds: another tab, a reset) gets the full state with its
+state_version. Fields are never removed from the state, only set to null,
+so a merge always yields the full new state.
+
+state_etag() names one such response for conditional GETs: the same state
+version, mission catalog version, delta base and encoding always produce
+the same body.
+"""
+import hashlib
+import secrets
+
+STATE_VERSION_HEADER = 'X-State-Version'
+
+
+def field_digests(state):
+    """Digest of every top-level field of a state dict."""
+    return {key: hashlib.blake2b(repr(value).encode(), digest_size=8).hexdigest()
+            for key, value in state.items()}
+
+
+def versioned(state, store, held_version=None):
+    """
+    Record state in store (the player's session) and return the payload to
+    send: the full state, or only its changed fields when held_version is
+    the version the store last handed out.
+    """
+    digests = field_digests(state)
+    previous = store.get('state_fields')
+    previous_version = store.get('state_version')
+    version = previous_version
+    if digests != previous or version is None:
+        version = store['state_version'] = secrets.token_hex(6)
+        store['state_fields'] = digests
+    if held_version is not None and held_version == previous_version:
+        changed = {key: value for key, value in state.items() if previous.get(key) != digests[key]}
+        return {'state_version': version, 'delta_from': held_version, **changed}
+    return {**state, 'state_version': version}
+
+
+def state_etag(version, catalog_version, delta_from=None, columnar=False):
+    """Strong ETag value of a state response."""
+    key = f"{version}:{catalog_version}:{delta_from or ''}:{'columnar' if columnar else 'json'}"
+    return hashlib.blake2b(key.encode(), digest_size=12).hexdigest()
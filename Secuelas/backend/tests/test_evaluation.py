@@ -0,0 +1,50 @@
+# Secuelas/backend/tests/test_evaluation.py
+"""
+Regression tests for MissionComparator with repeated column names.
+
+    cd backend && python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from evaluation import MissionComparator  # noqa: E402
+
+CORRECT_COLUMNS = ['id', 'nombre']
+CORRECT_ROWS = [(1, 'Ana'), (2, 'Luis')]
+UNORDERED_COLUMNS = {'column_order_matters': False}
+
+
+class DuplicateColumnTests(unittest.TestCase):
+    def comparator(self, columns=CORRECT_COLUMNS, rows=CORRECT_ROWS):
+        return MissionComparator(columns, rows, UNORDERED_COLUMNS)
+
+    def test_extra_duplicate_column_is_rejected(self):
+        comparator = self.comparator()
+        columns = ['id', 'nombre', 'id']
+        rows = [(1, 'Ana', 1), (2, 'Luis', 2)]
+        is_correct, message = comparator.compare(columns, rows)
+        self.assertFalse(is_correct)
+        self.assertIn('adicionales', message)
+        self.assertIsNone(comparator.diff(columns, rows))
+
+    def test_duplicate_replacing_a_column_is_rejected(self):
+        comparator = self.comparator()
+        columns = ['id', 'nombre', 'nombre']
+        rows = [(1, 'basura', 'Ana'), (2, 'basura', 'Luis')]
+        is_correct, _ = comparator.compare(columns, rows)
+        self.assertFalse(is_correct)
+        self.assertIsNone(comparator.diff(columns, rows))
+
+    def test_expected_duplicates_match_in_order(self):
+        comparator = self.comparator(['id', 'nombre', 'id'], [(1, 'Ana', 10), (2, 'Luis', 20)])
+        self.assertEqual(comparator.compare(['nombre', 'id', 'id'], [('Ana', 1, 10), ('Luis', 2, 20)]),
+                         (True, '¡Correcto!'))
+        is_correct, _ = comparator.compare(['nombre', 'id', 'id'], [('Ana', 10, 1), ('Luis', 20, 2)])
+        self.assertFalse(is_correct)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,48 @@
+# Secuelas/backend/tests/test_sandbox.py
+"""
+Regression tests for Sandbox resets.
+
+    cd backend && python -m pytest tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sandbox import EXPECTED_PREFIX, MissionTemplate, MissionTemplates, Sandbox  # noqa: E402
+
+SETUP = ["CREATE TABLE empleados (id INTEGER PRIMARY KEY, nombre TEXT)",
+         "INSERT INTO empleados VALUES (1, 'Ana'), (2, 'Luis')"]
+CORRECT_QUERY = "SELECT id, nombre FROM empleados"
+
+
+class DirtyRestoreTests(unittest.TestCase):
+    def setUp(self):
+        self.template = MissionTemplate(MissionTemplates.build(SETUP), (), 'f' * 64, tuple(SETUP))
+        self.sandbox = Sandbox('test')
+        self.sandbox.restore(1, self.template)
+
+    def tearDown(self):
+        self.sandbox.close()
+
+    def test_restore_after_in_engine_judgement(self):
+        table = self.sandbox.expected_table(CORRECT_QUERY)
+        self.sandbox.execute("UPDATE empleados SET nombre = 'X'")
+        self.sandbox.execute("CREATE TEMP TABLE borrador (a)")
+        self.assertTrue(self.sandbox.dirty)
+
+        self.sandbox.restore(1, self.template)
+
+        self.assertFalse(self.sandbox.dirty)
+        self.assertEqual(self.sandbox.execute("SELECT nombre FROM empleados ORDER BY id").fetchall(),
+                         [('Ana',), ('Luis',)])
+        temp_tables = [r[0] for r in self.sandbox.query_internal(
+            "SELECT name FROM sqlite_temp_master WHERE type = 'table'")]
+        self.assertEqual(temp_tables, [table])
+        self.assertTrue(table.startswith(EXPECTED_PREFIX))
+        self.assertEqual(self.sandbox.expected_table(CORRECT_QUERY), table)
+
+
+if __name__ == '__main__':
+    unittest.main()
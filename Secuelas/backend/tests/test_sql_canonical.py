@@ -0,0 +1,40 @@
+# Secuelas/backend/tests/test_sql_canonical.py
+"""
+Regression tests for canonicalize() and strip_trailing().
+
+    cd backend && python -m pytest tests
+"""
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_canonical import canonicalize, exact_fingerprint, fingerprint, strip_trailing  # noqa: E402
+
+
+class QuotedIdentifierTests(unittest.TestCase):
+    def test_quotings_are_kept(self):
+        # "foo" is a string when no column foo exists; [foo] is an error.
+        self.assertEqual(canonicalize('select [foo], `bar`, "baz"'), 'SELECT [foo], `bar`, "baz"')
+        self.assertNotEqual(fingerprint('SELECT "foo"'), fingerprint('SELECT [foo]'))
+
+
+class StripTrailingTests(unittest.TestCase):
+    def test_keeps_labels(self):
+        conn = sqlite3.connect(':memory:')
+        for sql in ("SELECT count( * ) FROM (SELECT 1 AS A) ;  -- fin", "select A+1 from (select 1 as a)/* x"):
+            stripped = strip_trailing(sql)
+            wrapped = conn.execute(f'SELECT * FROM ({stripped})')
+            self.assertEqual([d[0] for d in wrapped.description],
+                             [d[0] for d in conn.execute(sql).description])
+
+    def test_exact_fingerprint_tells_labels_apart(self):
+        self.assertEqual(fingerprint('SELECT count( * ) FROM t'), fingerprint('SELECT COUNT(*) FROM t'))
+        self.assertNotEqual(exact_fingerprint('SELECT count( * ) FROM t'), exact_fingerprint('SELECT COUNT(*) FROM t'))
+        self.assertEqual(exact_fingerprint('SELECT 1'), exact_fingerprint('  SELECT 1;\n-- fin'))
+
+
+if __name__ == '__main__':
+    unittest.main()
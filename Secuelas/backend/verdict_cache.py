@@ -0,0 +1,117 @@
+# Secuelas/backend/verdict_cache.py
+"""
+Cross-player cache of evaluated submissions.
+
+Players on the same mission keep sending the same few queries. A player
+query always runs against the mission's pristine data, so its result and
+verdict only depend on the mission's setup, correct query and evaluation
+options plus the player query, which together make the key: a repeat
+submission is answered from here without touching a sandbox, and a
+mission edited by any means (even raw SQL, from another worker process)
+simply stops matching its old entries. Queries are keyed up to
+sql_canonical.strip_trailing(), not canonicalize(): the cached result carries
+the player's column labels, which spacing and casing can change.
+
+Entries are kept in a bounded LRU charged an estimate of their size in
+bytes (VERDICT_CACHE_MAX_BYTES). Queries whose result can change between
+runs (random(), 'now', ...) and failed queries are never cached.
+"""
+import json
+import re
+import threading
+from collections import OrderedDict, namedtuple
+
+from sql_canonical import exact_fingerprint
+
+# result: the player's ResultSet; is_correct/message: the comparator's verdict;
+# diff: JSON-ready row diff for a wrong answer (result_diff.diff_to_json) or None.
+Verdict = namedtuple('Verdict', 'result is_correct message diff')
+
+_NONDETERMINISTIC_RE = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\bcurrent_(?:date|time|timestamp)\b|'now'",
+    re.IGNORECASE)
+
+
+def is_cacheable(sql):
+    """False for queries whose result may differ on identical data."""
+    return not _NONDETERMINISTIC_RE.search(sql)
+
+
+def verdict_size(verdict):
+    """Rough in-memory size of a Verdict, in bytes."""
+    # A diff is capped at a few rows, its repr is a fair estimate.
+    diff_size = len(repr(verdict.diff)) if verdict.diff else 0
+    return 64 + len(verdict.message or '') + verdict.result.nbytes() + diff_size
+
+
+class VerdictCache:
+    """LRU of Verdicts keyed by mission, its setup, correct query and options, and player query."""
+
+    def __init__(self, app=None, max_bytes=4 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # key -> (verdict, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_bytes = app.config.get('VERDICT_CACHE_MAX_BYTES', self.max_bytes)
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def key(mission_id, setup_fingerprint, correct_query, evaluation_options, sql):
+        return (mission_id, setup_fingerprint, exact_fingerprint(correct_query),
+                json.dumps(evaluation_options, sort_keys=True), exact_fingerprint(sql))
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, verdict):
+        size = verdict_size(verdict)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (verdict, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate_mission(self, mission_id):
+        """Drop every verdict for a mission (its query or options changed)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == mission_id]:
+                self._bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {'verdict_entries': len(self._entries),
+                    'verdict_bytes': self._bytes, 'verdict_max_bytes': self.max_bytes,
+                    'verdict_hits': self.hits, 'verdict_misses': self.misses,
+                    'verdict_hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+                    'verdict_evictions': self.evictions}
@@ -0,0 +1,98 @@
+# Secuelas/backend/wire_format.py
+"""
+Compact "columnar" encoding of query results for the JSON responses.
+
+By default a result goes out as "columns": [...] plus "results" (or "rows"
+on a result page): [[...], ...]. A client that adds ?format=columnar, or
+sends Accept: application/vnd.secuelas.columnar+json for a result of at
+least COLUMNAR_MIN_ROWS rows, gets the rows as an object instead:
+
+    {"types": ["integer", "text", ...],
+     "dictionaries": {"1": ["Ventas", "Sistemas", ...]},
+     "rows": [[1, 0], [2, 1], ...]}
+
+types tags every column with the SQLite storage class of its values
+('integer', 'real', 'text', 'blob', 'null', or 'mixed'). A text column with
+few distinct values (departamento, clasificacion, ...) is
+dictionary-encoded: its cells hold an index into dictionaries[<column
+index>] (NULL, when present, is one of the entries). Blobs, which JSON
+cannot carry, are sent as hex.
+
+Columnar responses are also serialized without sorting keys.
+
+The encoding is smaller, not faster. benchmarks/bench_wire_format.py
+(employee listing, 7 columns) measures it at about 45-60% of the plain
+JSON bytes, but 25-70% slower to produce at every size: 0.19 vs 0.32 ms at
+100 rows, 1.5 vs 2.2 ms at 1000. Gzipped, both are within about 10%. It
+only pays off on uncompressed links and for responses too big to go out
+at once: below COLUMNAR_MIN_ROWS rows a plain payload (~15 KB at 200
+rows) already fits in the first round trip of a new connection, so the
+Accept header alone does not switch to it. The bundled frontend never asks
+for it: a game state carries at most RESULT_PAGE_SIZE rows and ResultTable
+pages are as long, both well below COLUMNAR_MIN_ROWS. The encoding is for
+API clients fetching larger pages.
+"""
+import json
+
+from flask import current_app, request
+
+COLUMNAR_MIMETYPE = 'application/vnd.secuelas.columnar+json'
+
+_TYPE_TAGS = {int: 'integer', float: 'real', str: 'text', bytes: 'blob'}
+
+# Dictionary-encode a text column when its distinct values are at most this
+# share of its rows.
+DICTIONARY_MAX_RATIO = 0.5
+
+# Smallest result an Accept header gets in the columnar encoding (see above).
+COLUMNAR_MIN_ROWS = 200
+
+
+def wants_columnar(row_count):
+    """True when the current request gets its row_count rows in the columnar encoding."""
+    if request.args.get('format') == 'columnar':
+        return True
+    return (row_count >= COLUMNAR_MIN_ROWS and
+            request.accept_mimetypes.best_match(['application/json', COLUMNAR_MIMETYPE]) == COLUMNAR_MIMETYPE)
+
+
+def column_type(values):
+    """Type tag of a column from the storage classes of its non-NULL values."""
+    types = set(map(type, values))
+    types.discard(type(None))
+    if not types:
+        return 'null'
+    if len(types) > 1:
+        return 'mixed'
+    return _TYPE_TAGS.get(types.pop(), 'mixed')
+
+
+def encode_rows(rows, column_count):
+    """Columnar object for a list of row tuples (or lists)."""
+    columns = list(zip(*rows)) if rows else [()] * column_count
+    types = [column_type(values) for values in columns]
+    dictionaries = {}
+    changed = False
+    for ci, tag in enumerate(types):
+        values = columns[ci]
+        if tag == 'text':
+            distinct = dict.fromkeys(values)
+            if len(distinct) <= len(values) * DICTIONARY_MAX_RATIO:
+                dictionaries[str(ci)] = list(distinct)
+                index = {v: i for i, v in enumerate(distinct)}
+                columns[ci] = list(map(index.__getitem__, values))
+                changed = True
+        elif tag in ('blob', 'mixed'):
+            columns[ci] = [v.hex() if isinstance(v, bytes) else v for v in values]
+            changed = True
+    # json.dumps writes tuples as arrays: rows only need rebuilding when a column changed.
+    return {'types': types, 'dictionaries': dictionaries,
+            'rows': list(zip(*columns)) if changed else rows}
+
+
+def columnar_response(payload, status=200):
+    """JSON response with the columnar media type, keys in insertion order."""
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    response = current_app.response_class(body, status=status, mimetype=COLUMNAR_MIMETYPE)
+    response.vary.add('Accept')
+    return response
@@ -1,6 +1,8 @@
 import React, { useState, useEffect, useCallback } from 'react';
 import api from '../services/api';
 import HelpPanel from './HelpPanel';
+import ResultDiffPanel, { ResultDiff } from './ResultDiffPanel';
+import ResultTable from './ResultTable';
 import './GameTerminal.css';
 
 interface Mission {
@@ -12,8 +14,13 @@ interface Mission {
 
 interface GameState {
     mission: Mission | null;
-    results: Record<string, unknown>[] | null;
+    results: unknown[][] | null;  // first page of rows, matched to columns by position
     columns: string[] | null;
+    truncated?: boolean;
+    stopped?: boolean;            // reading stopped once the verdict was known
+    total_rows?: number | null;   // rows in the whole result
+    result_id?: string | null;    // rows past the first page: GET /results/<result_id>
+    diff?: ResultDiff | null;
     error: string | null;
     last_query: string;
     archived_findings: string[];
@@ -179,7 +186,7 @@ const GameTerminal: React.FC = () => {
     }
 
     const {
-        mission, results, columns, error, archived_findings,
+        mission, results, columns, truncated, stopped, total_rows, result_id, diff, error, archived_findings,
         is_final_mission, mission_completed_show_results, flash_messages,
     } = gameState;
 
@@ -236,20 +243,8 @@ const GameTerminal: React.FC = () => {
                         {results && columns && (
                             <div className="overflow-x-auto mb-4">
                                 <h3 className="text-lg mb-2">RESULTADOS DE TU CONSULTA:</h3>
-                                <table className="results-table">
-                                    <thead>
-                                        <tr>{columns.map(col => <th key={col}>{col}</th>)}</tr>
-                                    </thead>
-                                    <tbody>
-                                        {results.map((row, ri) => (
-                                            <tr key={ri}>
-                                                {columns.map(col => (
-                                                    <td key={`${ri}-${col}`}>{String(row[col] ?? '')}</td>
-                                                ))}
-                                            </tr>
-                                        ))}
-                                    </tbody>
-                                </table>
+                                <ResultTable columns={columns} rows={results}
+                                    totalRows={total_rows ?? results.length} resultId={result_id} />
                             </div>
                         )}
                         <button onClick={handleNextMission} className="btn btn-next" disabled={isLoading}>
@@ -315,25 +310,20 @@ const GameTerminal: React.FC = () => {
                     </section>
                 )}
 
+                {/* Row diff for a wrong answer */}
+                {diff && !error && !mission_completed_show_results && <ResultDiffPanel diff={diff} />}
+
                 {/* Query results */}
                 {results && columns && !error && !mission_completed_show_results && (
                     <section id="query-results" className="mt-4">
-                        <h3 className="text-lg mb-2">RESULTADOS ({results.length} filas):</h3>
+                        <h3 className="text-lg mb-2">
+                            RESULTADOS ({stopped ? 'más de ' : ''}{total_rows ?? results.length} filas
+                            {truncated ? ', truncado' : ''}
+                            {stopped ? ', lectura detenida al decidirse el veredicto' : ''}):
+                        </h3>
                         <div className="overflow-x-auto">
-                            <table className="results-table">
-                                <thead>
-                                    <tr>{columns.map(col => <th key={col}>{col}</th>)}</tr>
-                                </thead>
-                                <tbody>
-                                    {results.map((row, ri) => (
-                                        <tr key={ri}>
-                                            {columns.map(col => (
-                                                <td key={`${ri}-${col}`}>{String(row[col] ?? '')}</td>
-                                            ))}
-                                        </tr>
-                                    ))}
-                                </tbody>
-                            </table>
+                            <ResultTable columns={columns} rows={results}
+                                totalRows={total_rows ?? results.length} resultId={result_id} />
                         </div>
                     </section>
                 )}
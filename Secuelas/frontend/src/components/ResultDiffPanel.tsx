@@ -0,0 +1,76 @@
+import React from 'react';
+
+// Row diff sent with a wrong answer (backend result_diff.diff_to_json).
+// Rows are arrays matched to `columns` by position; lists are capped,
+// the *_count fields are the real totals.
+export interface ResultDiff {
+    columns: string[];
+    missing: [number | null, unknown[]][];
+    missing_count: number;
+    extra: [number, unknown[]][];
+    extra_count: number;
+    changed: [number, string, unknown, unknown][];
+    changed_count: number;
+    moved: [number, unknown[], unknown[]] | null;
+}
+
+const cell = (value: unknown) => String(value ?? 'NULL');
+
+const RowTable: React.FC<{ columns: string[]; rows: [number | null, unknown[]][] }> = ({ columns, rows }) => (
+    <table className="results-table">
+        <thead>
+            <tr><th>#</th>{columns.map((col, ci) => <th key={ci}>{col}</th>)}</tr>
+        </thead>
+        <tbody>
+            {rows.map(([n, row], ri) => (
+                <tr key={ri}>
+                    <td>{n ?? '—'}</td>
+                    {row.map((value, ci) => <td key={ci}>{cell(value)}</td>)}
+                </tr>
+            ))}
+        </tbody>
+    </table>
+);
+
+const more = (shown: number, total: number) => (total > shown ? ` (se muestran ${shown})` : '');
+
+const ResultDiffPanel: React.FC<{ diff: ResultDiff }> = ({ diff }) => (
+    <section id="result-diff" className="mt-4">
+        <h3 className="text-lg mb-2">DIFERENCIAS CON EL RESULTADO ESPERADO:</h3>
+        {diff.moved && (
+            <p className="mb-2">
+                Las filas son correctas pero no están en el orden pedido: en la fila {diff.moved[0]} se
+                esperaba ({diff.moved[1].map(cell).join(', ')}) y aparece ({diff.moved[2].map(cell).join(', ')}).
+            </p>
+        )}
+        {diff.changed_count > 0 && (
+            <div className="overflow-x-auto mb-2">
+                <p>Celdas con otro valor: {diff.changed_count}{more(diff.changed.length, diff.changed_count)}</p>
+                <table className="results-table">
+                    <thead>
+                        <tr><th>Fila</th><th>Columna</th><th>Se esperaba</th><th>Tu resultado</th></tr>
+                    </thead>
+                    <tbody>
+                        {diff.changed.map(([n, column, expected, found], i) => (
+                            <tr key={i}><td>{n}</td><td>{column}</td><td>{cell(expected)}</td><td>{cell(found)}</td></tr>
+                        ))}
+                    </tbody>
+                </table>
+            </div>
+        )}
+        {diff.missing_count > 0 && (
+            <div className="overflow-x-auto mb-2">
+                <p>Filas que faltan: {diff.missing_count}{more(diff.missing.length, diff.missing_count)}</p>
+                <RowTable columns={diff.columns} rows={diff.missing} />
+            </div>
+        )}
+        {diff.extra_count > 0 && (
+            <div className="overflow-x-auto mb-2">
+                <p>Filas que sobran: {diff.extra_count}{more(diff.extra.length, diff.extra_count)}</p>
+                <RowTable columns={diff.columns} rows={diff.extra} />
+            </div>
+        )}
+    </section>
+);
+
+export default ResultDiffPanel;
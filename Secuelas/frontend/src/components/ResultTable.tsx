@@ -0,0 +1,68 @@
+import React, { useEffect, useState } from 'react';
+import api from '../services/api';
+
+// One page of a stored result (backend GET /api/results/<id>).
+interface ResultPage {
+    rows: unknown[][];
+    next_offset: number | null;
+}
+
+interface ResultTableProps {
+    columns: string[];
+    rows: unknown[][];            // first page, sent with the game state
+    totalRows: number;            // rows in the whole result
+    resultId?: string | null;     // set when there are rows past the first page
+}
+
+const ResultTable: React.FC<ResultTableProps> = ({ columns, rows, totalRows, resultId }) => {
+    const [loaded, setLoaded] = useState<unknown[][]>(rows);
+    const [loading, setLoading] = useState(false);
+    const [loadError, setLoadError] = useState<string | null>(null);
+
+    useEffect(() => {
+        setLoaded(rows);
+        setLoadError(null);
+    }, [rows, resultId]);
+
+    const loadMore = async () => {
+        if (!resultId || loading) return;
+        setLoading(true);
+        try {
+            const res = await api.get<ResultPage>(`/results/${resultId}`, { params: { offset: loaded.length } });
+            setLoaded(prev => [...prev, ...res.data.rows]);
+            setLoadError(null);
+        } catch (err) {
+            console.error('Error loading result page:', err);
+            setLoadError('No se pudieron cargar más filas. Vuelva a ejecutar la consulta.');
+        } finally {
+            setLoading(false);
+        }
+    };
+
+    return (
+        <>
+            <table className="results-table">
+                <thead>
+                    <tr>{columns.map((col, ci) => <th key={ci}>{col}</th>)}</tr>
+                </thead>
+                <tbody>
+                    {loaded.map((row, ri) => (
+                        <tr key={ri}>
+                            {row.map((value, ci) => (
+                                <td key={ci}>{String(value ?? '')}</td>
+                            ))}
+                        </tr>
+                    ))}
+                </tbody>
+            </table>
+            {resultId && loaded.length < totalRows && (
+                <button type="button" className="btn mt-2" onClick={loadMore} disabled={loading}>
+                    {loading ? 'CARGANDO...' : `CARGAR MÁS FILAS (${loaded.length} de ${totalRows})`}
+                </button>
+            )}
+            {loadError && <p style={{ color: '#FF8888' }}>{loadError}</p>}
+        </>
+    );
+};
+
+export default ResultTable;
@@ -9,4 +9,35 @@ const api = axios.create({
   withCredentials: true, // Required for server-side session cookies
 });
 
+// Game states come back as deltas over the version we hold (backend
+// state_delta.py): send that version and merge the changed fields over our copy.
+const STATE_VERSION_HEADER = 'X-State-Version';
+type StatePayload = Record<string, unknown> & { state_version?: string; delta_from?: string };
+let heldState: StatePayload | null = null;
+
+api.interceptors.request.use(config => {
+  if (heldState?.state_version) config.headers[STATE_VERSION_HEADER] = heldState.state_version;
+  return config;
+});
+
+api.interceptors.response.use(async response => {
+  const data = response.data as StatePayload;
+  if (data && typeof data === 'object' && typeof data.state_version === 'string') {
+    if (data.delta_from === undefined) {
+      heldState = data;
+    } else if (heldState && heldState.state_version === data.delta_from) {
+      heldState = { ...heldState, ...data };
+      delete heldState.delta_from;
+    } else {
+      // A delta over a state we no longer hold (overlapping requests): start over.
+      heldState = null;
+      return api.get('/game_state');
+    }
+    response.data = heldState;
+    return response;
+  }
+  response.data = data;
+  return response;
+});
+
 export default api;